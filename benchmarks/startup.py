@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+
+"""
+Startup benchmark: cold interpreter, import of the kernels and first query.
+"""
+
+
+# Code executed in a fresh interpreter, prints timings as json
+_COLD_START = '''
+import time
+import json
+t_start = time.perf_counter()
+import engagement.functions as functions
+t_import = time.perf_counter()
+functions.warmup()
+t_warmup = time.perf_counter()
+functions.calc_win_rates(
+    *functions.calc_ttk_distribution(0.7, 0.7, 500., 500., 0., 286., 143., 0.1, 0., 0., 0., 0., 30, 0.),
+    *functions.calc_ttk_distribution(0.6, 0.5, 500., 500., 0., 250., 125., 0.08, 0., 0., 0., 0., 40, 0.),
+    0., 0.
+)
+t_query = time.perf_counter()
+print(json.dumps({
+    'import': t_import - t_start,
+    'warmup': t_warmup - t_import,
+    'first_query': t_query - t_warmup,
+}))
+'''
+
+
+def cold_start() -> dict:
+    """
+    Measures import, warm-up and first query of the kernels in a fresh Python process.
+
+    :return: Dictionary of timings [s]
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get('PYTHONPATH', '')]))
+    output = subprocess.run(
+        [sys.executable, '-c', _COLD_START], cwd=root, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def run(runs:int=5) -> list:
+    """
+    Repeats the cold start benchmark. The first run populates the on-disk kernel cache if it is empty.
+
+    :param runs: Number of fresh processes to start
+    :return: List of timing dictionaries
+    """
+    results = []
+    for i in range(runs):
+        timings = cold_start()
+        print(f'run {i}: ' + ', '.join(f'{k}={v * 1000:.1f}ms' for k, v in timings.items()))
+        results.append(timings)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure cold import and first call of the engagement kernels.')
+    parser.add_argument('--runs', type=int, default=5)
+    run(parser.parse_args().runs)
@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import numba
+import numpy as np
+from benchmarks.sweep import create_engagement
+from computation.graph import Graph, Input, Operation
+from engagement.classes import Engagement
+from engagement.compositions import win_rate, ttk_cache_clear
+from engagement.functions import calc_ttk_distribution, calc_win_rates, warmup
+from player.classes import Player
+from weapon.functions import calc_damage_body, calc_damage_head, calc_fly_time
+import ps2.weapon_loader
+
+
+"""
+Benchmark suite of the simulation hot paths. Results are saved as JSON, a baseline file of an earlier run is compared
+against the current run and slowdowns beyond a threshold are reported as regressions. Runs offline, weapon data is
+loaded from the bundled fixtures.
+"""
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, 'fixtures', '')
+FIXTURE_WEAPON = 70998
+
+
+def _ttk_case(clip_size:int, dynamic:bool):
+    # Time to kill kernel, dynamic cases heal and carry a decaying overshield
+    heal_rate, overshield, decay = (10., 100., 20.) if dynamic else (0., 0., 0.)
+    args = (0.6, 0.4, 500., 500., overshield, 286., 143., 0.08, 0.05, 0., 0., heal_rate, clip_size, decay, 0.)
+    return lambda: calc_ttk_distribution(*args)
+
+
+def _win_rates_case(length:int):
+    # Win rates of two distributions with the given number of entries
+    rng = np.random.default_rng(0)
+    dists = []
+    for _ in range(2):
+        times = np.append(np.sort(rng.uniform(0., 5., length - 1)), np.inf)
+        probs = rng.uniform(size=length)
+        dists += [times, probs / probs.sum()]
+    return lambda: calc_win_rates(*dists, 0.02, 0.03)
+
+
+def _win_rate_case():
+    # Full engagement of default players, cache cleared so the kernels run on every call
+    element = Engagement(Player(), Player()).space()[0]
+
+    def case():
+        ttk_cache_clear()
+        return win_rate(element)
+    return case
+
+
+def _simulate_case(n_combinations:int, columnar:bool):
+    eng = create_engagement(n_combinations)
+
+    def case():
+        ttk_cache_clear()
+        return eng.simulate(columnar=columnar)
+    return case
+
+
+def _graph_case(n_distances:int=100, n_damages:int=10, vectorized:bool=False):
+    # Damage and travel time graph over the cross product of distances and damages
+    inputs = [Input(name) for name in ('dmg_max', 'dmg_min', 'range_max', 'range_min', 'distance', 'multi', 'speed')]
+    dmg_max, dmg_min, range_max, range_min, distance, multi, speed = inputs
+    body = Operation(calc_damage_body, (dmg_max, dmg_min, range_max, range_min, distance), 'dmg_body', True)
+    head = Operation(calc_damage_head, (body, multi), 'dmg_head', True)
+    fly = Operation(calc_fly_time, (distance, speed), 'fly_time', True)
+    total = Operation(lambda h, b, t: (h + b) / (1 + t), (head, body, fly), 'total', True)
+    graph = Graph(inputs, total)
+    values = (list(np.linspace(125., 167., n_damages)), 112., 10., 65., list(np.linspace(0., 100., n_distances)), 2.,
+              600.)
+    return lambda: graph(*values, vectorized=vectorized)
+
+
+def _extract_stats_case():
+    attachments = ['Soft Point Ammunition', 'Compensator', 'Forward Grip']
+    return lambda: ps2.weapon_loader.extract_stats(FIXTURE_WEAPON, attachments=attachments, path=FIXTURE_DIR)
+
+
+def cases() -> dict:
+    """
+    Creates the benchmark cases. Setup work (players, graphs, input data) is done here and not measured.
+
+    :return: Dictionary of case name to function without arguments
+    """
+    return {
+        'ttk_static_clip_10': _ttk_case(10, False),
+        'ttk_static_clip_100': _ttk_case(100, False),
+        'ttk_dynamic_clip_10': _ttk_case(10, True),
+        'ttk_dynamic_clip_40': _ttk_case(40, True),
+        'win_rates_10': _win_rates_case(10),
+        'win_rates_100': _win_rates_case(100),
+        'win_rates_1000': _win_rates_case(1000),
+        'win_rate': _win_rate_case(),
+        'simulate_scalar_1k': _simulate_case(1_000, False),
+        'simulate_columnar_1k': _simulate_case(1_000, True),
+        'simulate_columnar_100k': _simulate_case(100_000, True),
+        'graph_call': _graph_case(),
+        'graph_call_vectorized_1m': _graph_case(10_000, 100, vectorized=True),
+        'extract_stats': _extract_stats_case(),
+    }
+
+
+def measure(function:callable, min_time:float=0.2, repeat:int=5) -> dict:
+    """
+    Times a function like timeit, the number of loops per repetition is chosen to take at least min_time.
+
+    :param function: Function without arguments
+    :param min_time: Minimum duration of one repetition [s]
+    :param repeat: Number of repetitions
+    :return: Dictionary with median and minimum time per call [s], loops and repetitions
+    """
+    # Warm up caches and lazily compiled code, then estimate the number of loops from one call
+    function()
+    elapsed = _time_loops(function, 1)
+    loops = max(int(np.ceil(min_time / max(elapsed, 1e-9))), 1)
+    elapsed = _time_loops(function, loops)
+    times = [elapsed / loops] + [_time_loops(function, loops) / loops for _ in range(repeat - 1)]
+    return {'median': statistics.median(times), 'min': min(times), 'loops': loops, 'repeat': repeat}
+
+
+def _time_loops(function:callable, loops:int) -> float:
+    t_start = time.perf_counter()
+    for _ in range(loops):
+        function()
+    return time.perf_counter() - t_start
+
+
+def run(names:list=None, min_time:float=0.2, repeat:int=5) -> dict:
+    """
+    Measures the benchmark cases.
+
+    :param names: Substrings of the case names to run, all cases if not provided
+    :param min_time: Minimum duration of one repetition [s]
+    :param repeat: Number of repetitions per case
+    :return: Dictionary with machine information and the timings per case
+    """
+    warmup()
+    results = {}
+    for name, function in cases().items():
+        if names and not any(n in name for n in names):
+            continue
+        results[name] = measure(function, min_time, repeat)
+        print(f"{name:<28}{_format_time(results[name]['median']):>12} (min {_format_time(results[name]['min'])})")
+    return {
+        'machine': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'numba': numba.__version__,
+            'platform': platform.platform(),
+            'threads': numba.config.NUMBA_NUM_THREADS,
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline:dict, current:dict, threshold:float=0.1) -> list:
+    """
+    Compares the median times of two runs.
+
+    :param baseline: Run used as reference
+    :param current: Run to check
+    :param threshold: Allowed relative slowdown, e.g. 0.1 for 10 %
+    :return: List of names of the cases slower than the baseline by more than the threshold
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            print(f'{name:<28}{_format_time(result["median"]):>12}  (not in baseline)')
+            continue
+        ratio = result['median'] / reference['median']
+        status = ''
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            status = 'improved'
+        print(f"{name:<28}{_format_time(reference['median']):>12}{_format_time(result['median']):>12}"
+              f"{ratio:>8.2f}x  {status}")
+    return regressions
+
+
+def _format_time(seconds:float) -> str:
+    for unit, scale in (('s', 1.), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3f} {unit}'
+    return f'{seconds / 1e-9:.1f} ns'
+
+
+def _load(path:str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def _save(path:str, results:dict):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=4)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the simulation hot paths and compare against a baseline.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    parser_run = subparsers.add_parser('run', help='measure all cases and save the results')
+    parser_run.add_argument('--output', default=BASELINE_FILE, help='JSON file for the results')
+    parser_compare = subparsers.add_parser('compare', help='compare a run against the baseline')
+    parser_compare.add_argument('--baseline', default=BASELINE_FILE, help='JSON file of the reference run')
+    parser_compare.add_argument('--current', help='JSON file of the run to check, measured now if not provided')
+    parser_compare.add_argument('--threshold', type=float, default=0.1, help='allowed relative slowdown')
+    for sub in (parser_run, parser_compare):
+        sub.add_argument('--filter', nargs='*', help='only run cases containing one of these substrings')
+        sub.add_argument('--min-time', type=float, default=0.2, help='minimum duration of one repetition [s]')
+        sub.add_argument('--repeat', type=int, default=5, help='repetitions per case')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        _save(args.output, run(args.filter, args.min_time, args.repeat))
+        print(f'saved to {args.output}')
+    else:
+        baseline = _load(args.baseline)
+        current = _load(args.current) if args.current else run(args.filter, args.min_time, args.repeat)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f'no regressions beyond {args.threshold:.0%}')
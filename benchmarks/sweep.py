@@ -0,0 +1,118 @@
+import time
+import argparse
+import itertools
+import numpy as np
+import constants
+import utils
+from engagement.classes import Engagement
+from engagement.compositions import ttk_cache_clear, ttk_class_info, ttk_class_reset, win_rate
+from engagement.functions import warmup
+from player.classes import Player
+
+
+"""
+Sweep benchmark: throughput of Engagement.simulate with the columnar table against per-combination dictionaries.
+"""
+
+
+def create_engagement(n_combinations:int) -> Engagement:
+    """
+    Creates an engagement sweeping distance, accuracy and headshot ratio of both players.
+
+    :param n_combinations: Approximate number of engagements
+    :return: Engagement with list parameters
+    """
+    # Split the sweep evenly on three parameters per player (cross product of both players)
+    n_values = max(int(round(n_combinations ** (1 / 6))), 1)
+    eng = Engagement(Player(), Player())
+    for player in (eng.player_1, eng.player_2):
+        player.distance = list(np.linspace(0., 100., n_values))
+        player.skill.accuracy = list(np.linspace(0.2, 0.9, n_values))
+        player.skill.headshot_ratio = list(np.linspace(0., 0.8, n_values))
+    eng.player_2.weapon.damage.max = [167]
+    eng.player_2.weapon.fire.time_refire = [0.08]
+    return eng
+
+
+def throughput(eng:Engagement, columnar:bool, max_combinations:int=None, workers:int=1) -> float:
+    """
+    Measures engagements per second of one simulation mode.
+
+    :param eng: Engagement to simulate
+    :param columnar: Use the columnar path
+    :param max_combinations: Only simulate the first engagements of the sweep (keeps the slow path short)
+    :param workers: Number of worker processes
+    :return: Engagements per second
+    """
+    space = eng.space()[:max_combinations]
+    t_start = time.perf_counter()
+    res = eng.simulate(columnar=columnar, space=space, workers=workers)
+    t_end = time.perf_counter()
+    return len(res['solution']['win_rates']) / (t_end - t_start)
+
+
+def throughput_reference(eng:Engagement, max_combinations:int) -> float:
+    """
+    Measures engagements per second of the per-combination path replaced by the columnar table: one nested dictionary
+    per combination, traced results aggregated into lists and no time to kill cache.
+
+    :param eng: Engagement to simulate
+    :param max_combinations: Only simulate the first engagements of the sweep
+    :return: Engagements per second
+    """
+    iterator = itertools.islice(itertools.product(
+        utils.iterate_class(eng.player_1, 'player_1'), utils.iterate_class(eng.player_2, 'player_2')
+    ), max_combinations)
+    aggregation = {'player_1': dict(), 'player_2': dict()}
+    ttk_cache_clear(0)
+    try:
+        t_start = time.perf_counter()
+        for players in iterator:
+            element = utils.tuple_to_dict(('engagement', players))
+            _ = win_rate(element, trace=True, fly_times=eng._fly_times(element))
+            utils.aggregate_dict(aggregation, element)
+        t_end = time.perf_counter()
+    finally:
+        ttk_cache_clear(constants.TTK_CACHE_SIZE)
+    return len(aggregation['solution']['win_rates']) / (t_end - t_start)
+
+
+def run(n_combinations:int=100_000, n_scalar:int=2_000, workers:int=1) -> dict:
+    """
+    Compares the columnar mode against the per-combination reference, which runs on a prefix of the sweep only.
+
+    :param n_combinations: Size of the sweep
+    :param n_scalar: Number of engagements for the per-combination reference
+    :param workers: Number of worker processes, additionally measures the process pool if more than one
+    :return: Dictionary of throughputs [1/s] and speed-up
+    """
+    warmup()
+    eng = create_engagement(n_combinations)
+    # Warm up fly time tables and caches
+    _ = throughput(eng, True, 100)
+    _ = throughput(eng, False, 100)
+
+    _ = throughput_reference(eng, 100)
+
+    results = {'scalar': throughput_reference(eng, n_scalar)}
+    ttk_class_reset()
+    results['columnar'] = throughput(eng, True)
+    results['speed_up'] = results['columnar'] / results['scalar']
+    results['classes'] = ttk_class_info()
+    print(f"scalar: {results['scalar']:.0f}/s, columnar: {results['columnar']:.0f}/s, "
+          f"speed-up: {results['speed_up']:.1f}x")
+    print(f"kernel calls: {results['classes']['kernel_calls']} for {results['classes']['parameter_sets']} "
+          f"distributions, {results['classes']['saved']} saved")
+    if workers > 1:
+        results['parallel'] = throughput(eng, True, workers=workers)
+        print(f"parallel ({workers} workers): {results['parallel']:.0f}/s")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the throughput of engagement parameter sweeps.')
+    parser.add_argument('--combinations', type=int, default=100_000)
+    parser.add_argument('--scalar', type=int, default=2_000)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+    run(args.combinations, args.scalar, args.workers)
@@ -1,4 +1,7 @@
 import itertools
+import collections
+import numba
+import numpy as np
 from typing import Iterable, Optional, List, Dict
 
 
@@ -6,11 +9,21 @@ class Operation:
     name: Optional[str]
     function: callable
     arguments: tuple
+    vectorized: bool
+    executor: Optional[str]
 
-    def __init__(self, function:callable, args:tuple, name:Optional[str]=None):
+    def __init__(self, function:callable, args:tuple, name:Optional[str]=None, vectorized:bool=False,
+                 executor:Optional[str]=None):
         self.name = name
         self.function = function
         self.arguments = args
+        # Function works element-wise on broadcastable arrays and can be called once for all combinations
+        self.vectorized = vectorized
+        # Pool of the parallel scheduler: 'thread' (functions releasing the GIL), 'process' (picklable functions
+        # holding the GIL) or None (evaluated by the scheduler itself)
+        if executor not in (None, 'thread', 'process'):
+            raise ValueError(f'Unknown executor for operation: {executor}')
+        self.executor = executor
 
     def __call__(self, *args, **kwargs):
         return self.function(*args)
@@ -23,10 +36,17 @@ class Input:
         self.name = name
 
 
+# Largest number of inputs for which the loop order of the input product is optimized (search over all subsets)
+MAX_ORDER_INPUTS = 10
+
+
 class Graph:
     inputs: Dict[Input, int]
     eval_order: List[Operation]
     names: Dict[Operation or Input, str]
+    dependencies: Dict[Operation, frozenset]
+    levels: List[List[Operation]]
+    stats: Dict[str, int]
 
     def __init__(self, inputs:List[Input], final_operation:Operation):
         # Convert list of Inputs to dict of Input->idx
@@ -39,16 +59,49 @@ class Graph:
         self._find_order(final_operation)
         # Get names
         self._get_names()
+        # Indices of the inputs every operation depends on (directly or through other operations)
+        self.dependencies = {}
+        for op in self.eval_order:
+            deps = set()
+            for arg in op.arguments:
+                if isinstance(arg, Operation):
+                    deps |= self.dependencies[arg]
+                elif arg in self.inputs:
+                    deps.add(self.inputs[arg])
+            self.dependencies[op] = frozenset(deps)
+        # Group operations into levels, operations of one level only depend on inputs and earlier levels
+        level = {}
+        self.levels = []
+        for op in self.eval_order:
+            level[op] = 1 + max((level[a] for a in op.arguments if isinstance(a, Operation)), default=-1)
+            if level[op] == len(self.levels):
+                self.levels.append([])
+            self.levels[level[op]].append(op)
+        # Operation evaluations of the last (non-vectorized) call or iteration, with and without reuse of cached values
+        self.stats = {}
+        # Loop orders of the input product per tuple of input sizes
+        self._orders = {}
 
     def _find_order(self, element):
-        # Only continue is current element is Operation
-        if isinstance(element, Operation):
-            # Recursively check all argument operations
-            for arg in element.arguments:
-                self._find_order(arg)
-            # Add current operation to evaluation eval_order if not added already
-            if element not in self.eval_order:
-                self.eval_order.append(element)
+        # Depth-first post-order without recursion (deep graphs), visited operations are kept in a set
+        visited = set()
+        stack = [(element, False)]
+        while stack:
+            node, expanded = stack.pop()
+            # Only continue is current element is Operation
+            if not isinstance(node, Operation):
+                continue
+            # All argument operations are ordered -> add current operation
+            if expanded:
+                self.eval_order.append(node)
+                continue
+            if node in visited:
+                continue
+            visited.add(node)
+            # Check all argument operations first, in order of the arguments
+            stack.append((node, True))
+            for arg in reversed(node.arguments):
+                stack.append((arg, False))
 
     def _get_names(self):
         for inp, i in self.inputs.items():
@@ -58,26 +111,212 @@ class Graph:
             name = f'op_{i}' if op.name is None else op.name
             self.names[self.eval_order[i]] = name
 
-    def __call__(self, *args, **kwargs):
+    def __call__(self, *args, vectorized:bool=False, **kwargs):
         # Wrap inputs in list if not already
         args = [a if isinstance(a, Iterable) else [a] for a in args]
-        # Initialize list to collect storage dicts
-        values_list = []
+        if vectorized:
+            return self._call_vectorized(args)
+        sizes = [len(a) for a in args]
+        n_combis = 1
+        for size in sizes:
+            n_combis *= size
+        # Loop over the product in an order that keeps the inputs most operations depend on outside, row index of a
+        # combination in the original order follows from the place values of the inputs
+        order = self._loop_order(sizes)
+        strides = [n_combis // size if size else 0 for size in itertools.accumulate(sizes, lambda a, b: a * b)]
+        # Deepest loop level each operation depends on (-1 for operations without inputs)
+        level = {i: p for p, i in enumerate(order)}
+        depth = {op: max((level[i] for i in self.dependencies[op]), default=-1) for op in self.eval_order}
+        # Initialize output columns
+        result = {k: [None] * n_combis for k in list(self.inputs) + self.eval_order}
+        inputs = list(self.inputs)
+        values = {}
+        previous = None
+        n_evals = 0
         # Iterate through all input combinations
-        for combi in itertools.product(*args):
-            # Create value storage dict with current combination added
-            values = {k: combi[v] for k, v in self.inputs.items()}
-            # Iterate through ordered evaluation operations
+        for combi in itertools.product(*[range(sizes[i]) for i in order]):
+            # Outermost loop level that changed, everything inside of it changed as well
+            changed = -1 if previous is None else next(p for p in range(len(order)) if combi[p] != previous[p])
+            previous = combi
+            for p in range(max(changed, 0), len(order)):
+                values[inputs[order[p]]] = args[order[p]][combi[p]]
+            # Only re-evaluate operations depending on a changed input, all others keep their cached value
             for operation in self.eval_order:
-                # Add evaluation result to storage dict
-                values[operation] = operation(*[values[a] for a in operation.arguments])
-            # Add complete storage dict to list
-            values_list.append(values)
-        # Merge storage dicts in list into a singe one
-        result = self._merge(values_list)
+                if depth[operation] >= changed:
+                    values[operation] = operation(*[values[a] for a in operation.arguments])
+                    n_evals += 1
+            # Write values into the row of the combination
+            row = sum(combi[p] * strides[i] for p, i in enumerate(order))
+            for k, v in values.items():
+                result[k][row] = v
+        self._set_stats(n_combis, n_evals)
+        # Change keys of dictionary to names
+        return self._rename(result)
+
+    def iter(self, *args, outputs:Optional[List[str]]=None, chunk_size:int=10_000):
+        """
+        Evaluates the graph like __call__, but yields the results chunk by chunk in the order of the combinations.
+        Only the operations needed for the selected outputs are evaluated and only the selected values are kept, so
+        memory is bounded by the chunk size (e.g. to write results to disk while they are computed).
+
+        :param args: Values of the inputs (lists or single values), like for __call__
+        :param outputs: Names of the inputs and operations to return, all if not provided
+        :param chunk_size: Number of combinations per chunk
+        :return: Generator of dictionaries of output name to list of values, one per combination of the chunk
+        """
+        # Wrap inputs in list if not already
+        args = [a if isinstance(a, Iterable) else [a] for a in args]
+        # Resolve output names
+        elements = {name: element for element, name in self.names.items()}
+        if outputs is None:
+            outputs = [self.names[k] for k in list(self.inputs) + self.eval_order]
+        for name in outputs:
+            if name not in elements:
+                raise ValueError(f'Unknown output of graph: {name}')
+        selected = [elements[name] for name in outputs]
+        # Operations the selected outputs depend on, in evaluation order
+        needed = set()
+        stack = [e for e in selected if isinstance(e, Operation)]
+        while stack:
+            op = stack.pop()
+            if op in needed:
+                continue
+            needed.add(op)
+            stack.extend(a for a in op.arguments if isinstance(a, Operation))
+        operations = [op for op in self.eval_order if op in needed]
+        # Deepest input each operation depends on (-1 for operations without inputs)
+        depth = {op: max(self.dependencies[op], default=-1) for op in operations}
+
+        inputs = list(self.inputs)
+        values = {}
+        previous = None
+        n_evals = 0
+        n_combis = 0
+        columns = [[] for _ in selected]
+        # Iterate through all input combinations in the order of __call__
+        for combi in itertools.product(*[range(len(a)) for a in args]):
+            # Outermost input that changed, everything after it changed as well
+            changed = -1 if previous is None else next(i for i in range(len(combi)) if combi[i] != previous[i])
+            previous = combi
+            for i in range(max(changed, 0), len(combi)):
+                values[inputs[i]] = args[i][combi[i]]
+            # Only re-evaluate operations depending on a changed input
+            for operation in operations:
+                if depth[operation] >= changed:
+                    values[operation] = operation(*[values[a] for a in operation.arguments])
+                    n_evals += 1
+            # Keep selected values only
+            for element, column in zip(selected, columns):
+                column.append(values[element])
+            n_combis += 1
+            # Chunks are counted in combinations, also without selected outputs
+            if n_combis % chunk_size == 0:
+                self._set_stats(n_combis, n_evals)
+                yield dict(zip(outputs, columns))
+                columns = [[] for _ in selected]
+        self._set_stats(n_combis, n_evals)
+        if n_combis % chunk_size:
+            yield dict(zip(outputs, columns))
+
+    def _set_stats(self, n_combis:int, n_evals:int):
+        n_naive = n_combis * len(self.eval_order)
+        self.stats = {'combinations': n_combis, 'evaluations': n_evals, 'naive': n_naive, 'saved': n_naive - n_evals}
+
+    def _loop_order(self, sizes:List[int]) -> List[int]:
+        # Order of the inputs in the product loop (outermost first) with the fewest operation evaluations. An
+        # operation is evaluated once per combination of the inputs up to its deepest dependency, the best order is
+        # found by dynamic programming over the sets of outer inputs. Orders are cached per input sizes.
+        n = len(sizes)
+        if n > MAX_ORDER_INPUTS or np.prod(sizes) <= 1:
+            return list(range(n))
+        order = self._orders.get(tuple(sizes))
+        if order is not None:
+            return order
+        n_sets = 1 << n
+        # Number of operations depending on a subset of the inputs of each set: operations counted per dependency
+        # mask, then summed over the subsets of every set one input at a time
+        complete = [0] * n_sets
+        for mask, count in collections.Counter(
+                sum(1 << i for i in self.dependencies[op]) for op in self.eval_order
+        ).items():
+            complete[mask] += count
+        for i in range(n):
+            for subset in range(n_sets):
+                if subset >> i & 1:
+                    complete[subset] += complete[subset ^ 1 << i]
+        cost = [float('inf')] * n_sets
+        size = [1] * n_sets
+        last = [-1] * n_sets
+        cost[0] = complete[0]
+        for outer in range(n_sets):
+            if cost[outer] == float('inf'):
+                continue
+            for j in range(n):
+                if outer >> j & 1:
+                    continue
+                new = outer | 1 << j
+                size[new] = size[outer] * sizes[j]
+                # Operations whose last dependency is added with this input
+                n_ops = complete[new] - complete[outer]
+                if cost[outer] + n_ops * size[new] < cost[new]:
+                    cost[new] = cost[outer] + n_ops * size[new]
+                    last[new] = j
+        # Walk back from the full set
+        order = []
+        outer = n_sets - 1
+        while outer:
+            order.append(last[outer])
+            outer &= ~(1 << last[outer])
+        order = order[::-1]
+        self._orders[tuple(sizes)] = order
+        return order
+
+    def compile(self, parallel:bool=True):
+        """
+        Fuses all operations into a single Numba kernel that loops over the combinations of the inputs. Graphs with
+        operations that can't be compiled (or non-scalar results) are evaluated by the interpreter instead.
+
+        :param parallel: Distribute the combinations across cores (prange)
+        :return: Compiled graph, called like the graph and returning one array per input and operation
+        """
+        return CompiledGraph(self, parallel)
+
+    def _call_vectorized(self, args:list) -> Dict[str, np.ndarray]:
+        # Give every input its own axis (sparse meshgrid), operations then only compute on the axes they depend on
+        n_dims = len(args)
+        values = {}
+        for inp, i in self.inputs.items():
+            shape = [1] * n_dims
+            shape[i] = len(args[i])
+            values[inp] = np.reshape(np.asarray(args[i]), shape)
+        # Iterate through ordered evaluation operations, each called once on whole arrays
+        for operation in self.eval_order:
+            arguments = [values[a] for a in operation.arguments]
+            if operation.vectorized:
+                value = np.asarray(operation(*arguments))
+            else:
+                value = self._call_elementwise(operation, arguments)
+            # Results with fewer axes (e.g. constants) broadcast from the right like NumPy
+            if value.ndim < n_dims:
+                value = value.reshape((1,) * (n_dims - value.ndim) + value.shape)
+            values[operation] = value
+        # Expand to one flat column per element, rows in the order of the combinations of __call__
+        shape = tuple(len(a) for a in args)
+        result = {k: np.broadcast_to(v, shape + v.shape[n_dims:]).reshape((-1,) + v.shape[n_dims:])
+                  for k, v in values.items()}
         # Change keys of dictionary to names
         return self._rename(result)
 
+    @staticmethod
+    def _call_elementwise(operation:Operation, arguments:list) -> np.ndarray:
+        # Operation without array support -> call once per element of the broadcast arguments
+        if not arguments:
+            return np.asarray(operation.function())
+        results = np.frompyfunc(operation.function, len(arguments), 1)(*arguments)
+        # Convert to numeric array if every result is a scalar
+        converted = np.array(results.tolist())
+        return converted if converted.shape == np.shape(results) else results
+
     def _rename(self, result:Dict[Operation or Input, list]):
         # Initialize output dict
         renamed = {}
@@ -87,23 +326,102 @@ class Graph:
             renamed[self.names[k]] = v
         return renamed
 
-    @staticmethod
-    def _merge(value_list: List[dict]):
-        # Initialize output dict
-        merged = {}
-        # Iterate through all list entries
-        for entry in value_list:
-            # Iterate through all dict entries
-            for k, v in entry.items():
-                # Check if already in dict
-                old_entry = merged.get(k)
-                # Create new entry if not
-                if old_entry is None:
-                    merged[k] = [v]
-                # Append to value list if yes
-                else:
-                    merged[k].append(v)
-        return merged
+
+class CompiledGraph:
+    """
+    Graph fused into one generated Numba function: every combination of the inputs is decoded from its row index
+    and all operations are evaluated in the loop body, results are written into one output array per element. A kernel
+    is built per combination of input dtypes on the first call. If an operation can't be compiled or returns
+    something else than a scalar, calls are passed on to the interpreter (Graph.__call__, results converted to
+    arrays).
+    """
+    graph: Graph
+    parallel: bool
+
+    def __init__(self, graph:Graph, parallel:bool=True):
+        self.graph = graph
+        self.parallel = parallel
+        self._kernels = {}
+
+    @property
+    def fused(self) -> Optional[bool]:
+        """
+        Whether the last built kernel is fused (None before the first call).
+        """
+        if not self._kernels:
+            return None
+        return list(self._kernels.values())[-1][0] is not None
+
+    def __call__(self, *args, **kwargs):
+        # Wrap inputs in list if not already
+        args = [a if isinstance(a, Iterable) else [a] for a in args]
+        arrays = [np.asarray(a) for a in args]
+        # Without combinations there is nothing to sample the output types from, no kernel is built (or cached)
+        if any(len(a) == 0 for a in arrays):
+            return self._interpret(args)
+        key = tuple(a.dtype.str for a in arrays)
+        if key not in self._kernels:
+            self._kernels[key] = self._build(arrays)
+        kernel, dtypes = self._kernels[key]
+        if kernel is None:
+            return self._interpret(args)
+        sizes = np.array([len(a) for a in arrays], dtype=np.int64)
+        n_combis = int(np.prod(sizes))
+        strides = np.array([int(np.prod(sizes[i + 1:])) for i in range(len(sizes))], dtype=np.int64)
+        outputs = [np.empty(n_combis, dtype=dtype) for dtype in dtypes]
+        kernel(*arrays, *outputs, sizes, strides, n_combis)
+        # Change keys of dictionary to names
+        return self.graph._rename(dict(zip(self._elements(), outputs)))
+
+    def _elements(self) -> list:
+        return list(self.graph.inputs) + self.graph.eval_order
+
+    def _interpret(self, args:list) -> Dict[str, np.ndarray]:
+        # Evaluate with the interpreter, outputs are arrays like those of the fused kernel
+        result = {}
+        for name, values in self.graph(*args).items():
+            try:
+                result[name] = np.asarray(values)
+            except ValueError:
+                # Non-scalar values of different shapes -> one object per combination
+                result[name] = np.empty(len(values), dtype=object)
+                result[name][:] = values
+        return result
+
+    def _build(self, arrays:List[np.ndarray]) -> tuple:
+        # Evaluate first combination with the interpreter to find the output types, only scalars can be fused
+        sample = self.graph(*[a[:1] for a in arrays])
+        dtypes = []
+        for element in self._elements():
+            value = np.asarray(sample[self.graph.names[element]][0])
+            if value.ndim != 0 or value.dtype.kind not in 'biuf':
+                return None, None
+            dtypes.append(value.dtype)
+        # Generate loop body, one local variable per element
+        n_inputs = len(self.graph.inputs)
+        variables = {element: f'v{k}' for k, element in enumerate(self._elements())}
+        namespace = {'prange': numba.prange}
+        params = [f'a{i}' for i in range(n_inputs)] + [f'o{k}' for k in range(len(variables))]
+        lines = [f"def fused({', '.join(params)}, sizes, strides, n):", '    for r in prange(n):']
+        for inp, i in self.graph.inputs.items():
+            lines.append(f'        {variables[inp]} = a{i}[(r // strides[{i}]) % sizes[{i}]]')
+        for j, op in enumerate(self.graph.eval_order):
+            function = op.function
+            if not isinstance(function, numba.core.dispatcher.Dispatcher):
+                function = numba.njit(function)
+            namespace[f'f{j}'] = function
+            lines.append(f"        {variables[op]} = f{j}({', '.join(variables[a] for a in op.arguments)})")
+        for element, k in zip(self._elements(), range(len(variables))):
+            lines.append(f'        o{k}[r] = {variables[element]}')
+        exec('\n'.join(lines), namespace)
+        kernel = numba.njit(parallel=self.parallel)(namespace['fused'])
+        # Compile on the first combination, fall back to the interpreter if any operation can't be compiled
+        try:
+            kernel(*[a[:1] for a in arrays], *[np.empty(1, dtype=d) for d in dtypes],
+                   np.ones(n_inputs, dtype=np.int64), np.ones(n_inputs, dtype=np.int64), 1)
+        except numba.core.errors.NumbaError:
+            return None, None
+        return kernel, dtypes
 
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+import os
+import multiprocessing
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Iterable, Optional, List, Dict
+from computation.graph import Graph
+
+
+"""
+Parallel evaluation of graphs. The input product is split into chunks of combinations, the operations of a level
+of the graph are independent of each other and are evaluated for all chunks at once on a thread or process pool.
+"""
+
+
+class Scheduler:
+    """
+    Evaluates a graph like Graph.__call__ (same outputs in the same order), with the operations of each level and
+    the chunks of the input product distributed to pools. Operations choose their pool with their executor hint:
+    'thread' for functions releasing the GIL (e.g. Numba nogil kernels), 'process' for picklable functions holding the
+    GIL, None to evaluate them in the calling thread. Pools are started on first use and kept until close().
+    """
+    graph: Graph
+    threads: int
+    processes: int
+    chunk_size: int
+    stats: Dict[str, int]
+
+    def __init__(self, graph:Graph, threads:Optional[int]=None, processes:Optional[int]=None, chunk_size:int=10_000):
+        self.graph = graph
+        self.threads = os.cpu_count() if threads is None else threads
+        self.processes = os.cpu_count() if processes is None else processes
+        self.chunk_size = chunk_size
+        # Operation evaluations and tasks of the last call
+        self.stats = {}
+        self._pools = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        """
+        Shuts down the pools.
+
+        :return: None
+        """
+        for pool in self._pools.values():
+            pool.shutdown()
+        self._pools = {}
+
+    def __call__(self, *args) -> Dict[str, list]:
+        # Wrap inputs in list if not already
+        args = [a if isinstance(a, Iterable) else [a] for a in args]
+        sizes = [len(a) for a in args]
+        n_combis = int(np.prod(sizes))
+        # Number of combinations of all later inputs (place value of each input in the row index)
+        strides = [int(np.prod(sizes[i + 1:])) for i in range(len(sizes))]
+        chunks = [(start, min(start + self.chunk_size, n_combis)) for start in range(0, n_combis, self.chunk_size)]
+
+        # Input columns follow from the row index
+        columns = {}
+        rows = np.arange(n_combis)
+        for inp, i in self.graph.inputs.items():
+            columns[inp] = [args[i][j] for j in (rows // strides[i]) % sizes[i]] if sizes[i] else []
+        n_evals = 0
+        n_tasks = 0
+        # Levels are evaluated one after another, operations and chunks within a level in parallel
+        for level in self.graph.levels:
+            tasks = []
+            for op in level:
+                columns[op] = [None] * n_combis
+                for start, stop in chunks:
+                    # Operation is only evaluated once per combination of its dependencies within the chunk
+                    first, inverse = _unique_dependencies(self.graph.dependencies[op], start, stop, sizes, strides)
+                    arguments = [tuple(columns[a][start + r] for a in op.arguments) for r in first]
+                    pool = self._pool(op.executor)
+                    result = _evaluate(op.function, arguments) if pool is None else pool.submit(
+                        _evaluate, op.function, arguments
+                    )
+                    tasks.append((op, start, inverse, result))
+                    n_evals += len(first)
+                    n_tasks += 1
+            # Collect results in submission order and expand them to the rows of the chunks
+            for op, start, inverse, result in tasks:
+                values = result if isinstance(result, list) else result.result()
+                columns[op][start:start + len(inverse)] = [values[j] for j in inverse]
+
+        n_naive = n_combis * len(self.graph.eval_order)
+        self.stats = {
+            'combinations': n_combis,
+            'evaluations': n_evals,
+            'naive': n_naive,
+            'saved': n_naive - n_evals,
+            'tasks': n_tasks,
+        }
+        # Change keys of dictionary to names, same order as Graph.__call__
+        return self.graph._rename({k: columns[k] for k in list(self.graph.inputs) + self.graph.eval_order})
+
+    def _pool(self, executor:Optional[str]):
+        # Start pool on first use, operations without hint are evaluated in the calling thread
+        if executor is None:
+            return None
+        pool = self._pools.get(executor)
+        if pool is None:
+            if executor == 'thread':
+                pool = ThreadPoolExecutor(self.threads)
+            else:
+                pool = ProcessPoolExecutor(self.processes, multiprocessing.get_context('spawn'))
+            self._pools[executor] = pool
+        return pool
+
+
+def _unique_dependencies(dependencies:frozenset, start:int, stop:int, sizes:List[int], strides:List[int]) -> tuple:
+    # Mixed-radix code of the dependency values of every row of the chunk
+    rows = np.arange(start, stop)
+    codes = np.zeros(stop - start, dtype=np.int64)
+    for i in sorted(dependencies):
+        codes = codes * sizes[i] + (rows // strides[i]) % sizes[i]
+    # First row (relative to the chunk start) of every distinct code and code index of every row
+    _, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+    return first.tolist(), inverse.reshape(-1).tolist()
+
+
+def _evaluate(function:callable, arguments:List[tuple]) -> list:
+    # Runs in the pools, evaluates an operation for a list of argument tuples
+    return [function(*a) for a in arguments]
+
+
+if __name__ == '__main__':
+    pass
@@ -2,6 +2,13 @@ import numpy as np
 
 DIR = 'C:\\Users\\Marco\\Dropbox\\Privat\\Coding Projects\\Python\\engagement_simulation\\'
 
+# Hit zone radii of the target for Monte Carlo engagements [m]
+TARGET_RADIUS_BODY = 0.3
+TARGET_RADIUS_HEAD = 0.1
+
+# Maximum number of time to kill distributions kept in the cache
+TTK_CACHE_SIZE = 4096
+
 # Player colors for plotting
 PLAYER_COLORS = ['royalblue', 'firebrick', 'grey']
 
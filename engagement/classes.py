@@ -1,10 +1,131 @@
+import json
+import hashlib
 import itertools
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numba
+import numpy as np
+import instrumentation
 import utils
-from engagement.compositions import win_rate
+from engagement.compositions import win_rate, win_rate_batch
+from engagement.functions import warmup
+from engagement.results import RaggedArray, Results
+from engagement.store import ResultStore
 from plotting import presets
 from player.classes import Player
 
 
+class SweepSpace:
+    """
+    Cartesian product of all parameter lists of both players, indexed like a sequence without materializing the
+    combinations. Combination i is decoded from i as a mixed-radix number, the last parameter varying fastest (same
+    order as itertools.product). Slices with step 1 return the corresponding contiguous part of the space.
+    """
+    columns: list
+    sizes: list
+    strides: list
+    start: int
+    stop: int
+
+    def __init__(self, player_1:Player, player_2:Player, start:int=0, stop:int=None):
+        self.columns = utils.iterate_columns(player_1, 'player_1') + utils.iterate_columns(player_2, 'player_2')
+        # Number of combinations of all later parameters (place value of each digit)
+        self.sizes = [len(values) for _, values in self.columns]
+        self.strides = [int(np.prod(self.sizes[i + 1:])) for i in range(len(self.sizes))]
+        self._size = int(np.prod(self.sizes))
+        self.start = start
+        self.stop = self._size if stop is None else stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, item):
+        # Slice -> sub space sharing the parameter columns
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError('Sweep space only supports contiguous slices')
+            return self._subspace(self.start + start, self.start + max(start, stop))
+        # Index -> nested parameter dictionary of the combination
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('Sweep space index out of range')
+        return self._combination(self.start + item)
+
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield self._combination(i)
+
+    def chunks(self, chunk_size:int):
+        """
+        Splits the space into contiguous sub spaces.
+
+        :param chunk_size: Number of combinations per chunk (the last chunk may be smaller)
+        :return: Generator of sweep spaces
+        """
+        for start in range(self.start, self.stop, chunk_size):
+            yield self._subspace(start, min(start + chunk_size, self.stop))
+
+    def column(self, path:tuple) -> np.ndarray:
+        """
+        Returns the values of one parameter for all combinations of the space.
+
+        :param path: Tuple of field names, e.g. ('player_1', 'weapon', 'ammo', 'clip_size')
+        :return: Array with one entry per combination
+        """
+        i = [p for p, _ in self.columns].index(tuple(path))
+        rows = np.arange(self.start, self.stop)
+        return np.asarray(self.columns[i][1])[(rows // self.strides[i]) % self.sizes[i]]
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the parameter values of both players and the row range, identifies the sweep of a result store.
+
+        :return: Hex digest
+        """
+        description = [[list(path), np.asarray(values).tolist()] for path, values in self.columns]
+        description.append([self.start, self.stop])
+        return hashlib.sha256(json.dumps(description).encode()).hexdigest()
+
+    def table(self, table:np.ndarray=None) -> np.ndarray:
+        """
+        Creates the columnar parameter table of the space, one row per combination and one field per parameter.
+
+        :param table: Structured array of dtype() to write the rows into (e.g. the rows of a chunk in the table of
+            the whole space), created if not provided
+        :return: Structured array with fields named like 'player_1.weapon.damage.max'
+        """
+        return utils.product_table(self.columns, self.start, self.stop, table)
+
+    def dtype(self) -> np.dtype:
+        """
+        Data type of the columnar parameter table.
+
+        :return: Structured data type
+        """
+        return utils.table_dtype(self.columns)
+
+    def _subspace(self, start:int, stop:int):
+        space = SweepSpace.__new__(SweepSpace)
+        space.__dict__.update(self.__dict__)
+        space.start = start
+        space.stop = stop
+        return space
+
+    def _combination(self, index:int) -> dict:
+        # Decode digit of each parameter and write its value into a nested dictionary
+        combination = {}
+        for (path, values), size, stride in zip(self.columns, self.sizes, self.strides):
+            temp = combination
+            for key in path[:-1]:
+                temp = temp.setdefault(key, {})
+            temp[path[-1]] = values[(index // stride) % size]
+        return combination
+
+
 class Engagement:
     player_1: Player
     player_2: Player
@@ -13,25 +134,273 @@ class Engagement:
         self.player_1 = player_1
         self.player_2 = player_2
 
-    def simulate(self):
-        iterator = map(
-            utils.tuple_to_dict,
-            zip(
-                itertools.cycle('engagement'),
-                zip(utils.iterate_class(self.player_1, 'player_1'), utils.iterate_class(self.player_2, 'player_2'))
-            )
+    def simulate(self, columnar:bool=False, chunk_size:int=10_000, space:SweepSpace=None, workers:int=1,
+                 store:str=None, resume:bool=True, report:str=None):
+        """
+        Computes win rates for all combinations of the parameters of both players (cross product of both players).
+
+        :param columnar: Use the columnar table and batched kernels instead of one nested dictionary per combination
+        :param chunk_size: Number of engagements per kernel call in columnar mode (and per task with workers)
+        :param space: Part of the sweep space to simulate, full space if not provided
+        :param workers: Number of worker processes, more than one implies columnar mode
+        :param store: Directory of an on-disk result store, results are streamed into it (implies columnar mode)
+        :param resume: Skip the chunks checkpointed in an existing store of the same sweep, overwrite the store if False
+        :param report: Path of a JSON file, instruments the simulation (stage times, kernel calls and dynamic
+            programming statistics, see instrumentation.report) and writes the report to it
+        :return: Results with parameter and solution columns, distributions as ragged arrays (ResultStore if store
+            is provided)
+        """
+        if space is None:
+            space = self.space()
+        recording = instrumentation.recording(report) if report is not None else contextlib.nullcontext()
+        with recording, instrumentation.stage('simulate'):
+            if columnar or workers > 1 or store is not None:
+                return self._simulate_columnar(space, chunk_size, workers, store, resume)
+            return self._simulate_scalar(space)
+
+    def space(self) -> SweepSpace:
+        """
+        Creates the sweep space over the current parameters of both players.
+
+        :return: Sweep space
+        """
+        return SweepSpace(self.player_1, self.player_2)
+
+    def _simulate_scalar(self, space:SweepSpace) -> Results:
+        # Scalar outputs are written into preallocated columns, distributions are appended to ragged arrays
+        n_rows = len(space)
+        solutions = {('solution', 'win_rates'): np.empty((n_rows, 3))}
+        for key in ('player_1', 'player_2'):
+            solutions[(key, 'solution', 'ref_time')] = np.empty(n_rows)
+            solutions[(key, 'solution', 'time_to_kill')] = RaggedArray()
+            solutions[(key, 'solution', 'kill_probability')] = RaggedArray()
+
+        for i in range(n_rows):
+            with instrumentation.stage('space'):
+                element = space[i]
+            with instrumentation.stage('fly_times'):
+                fly_times = self._fly_times(element)
+            solutions[('solution', 'win_rates')][i] = win_rate(element, trace=True, fly_times=fly_times)
+            with instrumentation.stage('collect'):
+                for key in ('player_1', 'player_2'):
+                    sol = element[key]['solution']
+                    solutions[(key, 'solution', 'ref_time')][i] = sol['ref_time']
+                    solutions[(key, 'solution', 'time_to_kill')].append(sol['time_to_kill'])
+                    solutions[(key, 'solution', 'kill_probability')].append(sol['kill_probability'])
+
+        with instrumentation.stage('results'):
+            for values in solutions.values():
+                if isinstance(values, RaggedArray):
+                    values.compact()
+            return self._results(space, solutions)
+
+    def _simulate_columnar(self, space:SweepSpace, chunk_size:int, workers:int=1, store:str=None,
+                           resume:bool=True):
+        layout = self._solution_layout(space)
+        if store is not None:
+            return self._simulate_store(space, chunk_size, workers, layout, store, resume)
+        # Parameter table of the whole space, chunks write their rows into it instead of building it twice
+        table = np.empty(len(space), dtype=space.dtype())
+        if workers > 1:
+            solutions = _simulate_parallel(self, space, chunk_size, workers, layout, table=table)
+        else:
+            # Preallocate output columns and fill them chunk by chunk
+            solutions = {path: np.full(shape, fill) for path, shape, fill, _ in layout}
+            for chunk in space.chunks(chunk_size):
+                self._simulate_chunk(chunk, solutions, space.start, table)
+
+        # Strip the padding of the distributions
+        with instrumentation.stage('results'):
+            columns = utils.table_to_dict(table)
+            for path, _, _, length_path in layout:
+                if length_path is not None:
+                    lengths = table['.'.join(length_path)].astype(np.int64) + 1
+                    solutions[path] = RaggedArray.from_padded(solutions[path], lengths)
+            return self._results(space, solutions, columns)
+
+    def _simulate_store(self, space:SweepSpace, chunk_size:int, workers:int, layout:list, store:str,
+                        resume:bool) -> ResultStore:
+        # Continue a checkpointed sweep of the same space, start a new store otherwise
+        if resume and ResultStore.exists(store):
+            result_store = ResultStore(store)
+            if result_store.fingerprint != space.fingerprint():
+                raise ValueError(f'Result store {store} belongs to a different sweep, use resume=False to overwrite it')
+            chunk_size = result_store.chunk_size
+        else:
+            with instrumentation.stage('create_store'):
+                result_store = ResultStore.create(store, space, layout, chunk_size)
+        done = result_store.chunks_done
+
+        # Rows are written to disk chunk by chunk, completed chunks are checkpointed in the schema
+        if workers > 1:
+            _simulate_parallel(self, space, chunk_size, workers, layout, result_store, done)
+        else:
+            for index, chunk in enumerate(space.chunks(chunk_size)):
+                if index in done:
+                    continue
+                solutions = self._chunk_solutions(chunk, layout)
+                with instrumentation.stage('write'):
+                    result_store.write(chunk.start - space.start, solutions)
+                with instrumentation.stage('checkpoint'):
+                    result_store.mark_done(index)
+        return ResultStore(store)
+
+    def _chunk_solutions(self, chunk:SweepSpace, layout:list) -> dict:
+        # Output columns of a single chunk
+        solutions = {path: np.full((len(chunk),) + shape[1:], fill) for path, shape, fill, _ in layout}
+        self._simulate_chunk(chunk, solutions, chunk.start)
+        return solutions
+
+    def _results(self, space:SweepSpace, solutions:dict, columns:dict=None) -> Results:
+        # Nest output columns into the parameter columns
+        if columns is None:
+            columns = utils.table_to_dict(space.table())
+        for path, values in solutions.items():
+            temp = columns
+            for key in path[:-1]:
+                temp = temp.setdefault(key, {})
+            temp[path[-1]] = values
+        return Results(columns)
+
+    def _solution_layout(self, space:SweepSpace) -> list:
+        # Path, shape, initial value and row length parameter (distributions) of every output column. Distributions
+        # are padded to the largest clip and have clip size + 1 entries per row.
+        n_rows = len(space)
+        layout = [(('solution', 'win_rates'), (n_rows, 3), np.nan, None)]
+        for key in ('player_1', 'player_2'):
+            clip_path = (key, 'weapon', 'ammo', 'clip_size')
+            width = int(max(dict(space.columns)[clip_path])) + 1
+            layout += [
+                ((key, 'solution', 'ref_time'), (n_rows,), np.nan, None),
+                ((key, 'solution', 'time_to_kill'), (n_rows, width), np.inf, clip_path),
+                ((key, 'solution', 'kill_probability'), (n_rows, width), 0., clip_path),
+            ]
+        return layout
+
+    def _simulate_chunk(self, chunk:SweepSpace, solutions:dict, offset:int=0, table:np.ndarray=None):
+        # Compute one chunk of the space and write it into the output rows of the chunk, parameters into the rows of
+        # the table if provided
+        rows = slice(chunk.start - offset, chunk.stop - offset)
+        with instrumentation.stage('table'):
+            columns = utils.table_to_dict(chunk.table(None if table is None else table[rows]))
+        with instrumentation.stage('fly_times'):
+            fly_times = self._fly_times_columnar(columns)
+        solutions[('solution', 'win_rates')][rows] = win_rate_batch(columns, trace=True, fly_times=fly_times)
+        # Copy traced results into the output columns
+        with instrumentation.stage('collect'):
+            for key in ('player_1', 'player_2'):
+                sol = columns[key]['solution']
+                width = sol['time_to_kill'].shape[1]
+                solutions[(key, 'solution', 'ref_time')][rows] = sol['ref_time']
+                solutions[(key, 'solution', 'time_to_kill')][rows, :width] = sol['time_to_kill']
+                solutions[(key, 'solution', 'kill_probability')][rows, :width] = sol['kill_probability']
+
+    def _fly_times(self, element:dict) -> list:
+        # Look up ballistic travel times in the (cached) tables of both weapons
+        fly_times = []
+        for player, key in ((self.player_1, 'player_1'), (self.player_2, 'player_2')):
+            table = player.weapon.fly_time_table(**element[key]['weapon']['projectile'])
+            fly_times.append(table(element[key]['distance']))
+        return fly_times
+
+    def _fly_times_columnar(self, columns:dict) -> list:
+        # Look up travel times once per projectile combination of each player
+        fly_times = []
+        for player, key in ((self.player_1, 'player_1'), (self.player_2, 'player_2')):
+            projectile = vars(player.weapon.projectile)
+            distance = np.asarray(columns[key]['distance'], dtype=np.float64)
+            fly_time = np.empty(len(distance))
+            for params in itertools.product(*projectile.values()):
+                params = dict(zip(projectile.keys(), params))
+                # Rows using this combination
+                mask = np.ones(len(distance), dtype=bool)
+                for name, value in params.items():
+                    if len(projectile[name]) > 1:
+                        mask &= columns[key]['weapon']['projectile'][name] == value
+                table = player.weapon.fly_time_table(**params)
+                fly_time[mask] = table(distance[mask])
+            fly_times.append(fly_time)
+        return fly_times
+
+
+def _simulate_parallel(engagement:Engagement, space:SweepSpace, chunk_size:int, workers:int, layout:list,
+                       store:ResultStore=None, skip:set=(), table:np.ndarray=None) -> dict:
+    # Output columns live in shared memory (or the result store), workers write their rows in place and only return
+    # when done. The parent fills the parameter table (if provided) while the workers compute.
+    blocks = []
+    try:
+        specs = []
+        if store is None:
+            for path, shape, fill, _ in layout:
+                block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+                blocks.append(block)
+                np.ndarray(shape, buffer=block.buf)[...] = fill
+                specs.append((path, shape, block.name))
+        # Spawned workers load the cached kernels once, cores are split among them
+        threads = max(numba.config.NUMBA_NUM_THREADS // workers, 1)
+        context = multiprocessing.get_context('spawn')
+        init_args = (
+            engagement, space.start, threads, specs, layout, None if store is None else store.path,
+            instrumentation.enabled()
         )
-        aggregation = {
-            'player_1': dict(),
-            'player_2': dict(),
-        }
+        with ProcessPoolExecutor(workers, context, _init_worker, init_args) as pool:
+            futures = {
+                pool.submit(_simulate_worker, (chunk.start, chunk.stop)): index
+                for index, chunk in enumerate(space.chunks(chunk_size)) if index not in skip
+            }
+            if table is not None:
+                with instrumentation.stage('table'):
+                    space.table(table)
+            # Checkpoint chunks in the store as they complete, collect the instrumentation records of the workers
+            for future in as_completed(futures):
+                worker_report = future.result()
+                if worker_report is not None:
+                    instrumentation.merge(worker_report)
+                if store is not None:
+                    with instrumentation.stage('checkpoint'):
+                        store.mark_done(futures[future])
+        # Copy results out of shared memory before releasing it
+        return {path: np.array(np.ndarray(shape, buffer=block.buf)) for (path, shape, _), block in zip(specs, blocks)}
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
 
-        for element in iterator:
-            _ = win_rate(element, trace=True)
-            utils.aggregate_dict(aggregation, element)
+def _init_worker(engagement:Engagement, offset:int, threads:int, specs:list, layout:list, store:str,
+                 instrument:bool):
+    numba.set_num_threads(threads)
+    warmup()
+    if instrument:
+        instrumentation.enable()
+    blocks = [shared_memory.SharedMemory(name=name) for _, _, name in specs]
+    _worker['engagement'] = engagement
+    _worker['space'] = engagement.space()
+    _worker['offset'] = offset
+    _worker['blocks'] = blocks
+    _worker['solutions'] = {path: np.ndarray(shape, buffer=b.buf) for (path, shape, _), b in zip(specs, blocks)}
+    _worker['layout'] = layout
+    _worker['store'] = ResultStore(store) if store is not None else None
 
-        return aggregation
 
+def _simulate_worker(rows:tuple):
+    # Records of this task only, returned to the parent if instrumentation is enabled
+    instrumentation.reset()
+    start, stop = rows
+    chunk = _worker['space'][start:stop]
+    if _worker['store'] is not None:
+        solutions = _worker['engagement']._chunk_solutions(chunk, _worker['layout'])
+        with instrumentation.stage('write'):
+            _worker['store'].write(start - _worker['offset'], solutions)
+            # Make rows visible to the parent before reporting completion
+            _worker['store'].flush()
+    else:
+        _worker['engagement']._simulate_chunk(chunk, _worker['solutions'], _worker['offset'])
+    return instrumentation.report() if instrumentation.enabled() else None
 
 if __name__ == '__main__':
     eng = Engagement(Player(), Player())
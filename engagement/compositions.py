@@ -1,19 +1,26 @@
 from weapon.functions import *
 from player.functions import *
 from engagement.functions import *
+from engagement.monte_carlo import calc_ttk_monte_carlo
+import functools
+import constants
+import instrumentation
 import utils
 
 
-def time_to_kill(attacker:dict, target:dict=None, fly_time=None, trace:bool=False):
-    if target is None:
-        target = attacker['player_2']
-        attacker = attacker['player_1']
+def _fly_time(player:dict, drag:bool=False):
+    # Straight flight to the target, optionally slowed down by projectile drag
+    return calc_fly_time(
+        distance=player['distance'],
+        projectile_speed=player['weapon']['projectile']['speed'],
+        drag=player['weapon']['projectile']['drag'] if drag else 0.
+    )
+
 
+def _kernel_args(attacker:dict, target:dict, fly_time=None, drag:bool=False) -> tuple:
+    # Refire time and arguments of the time to kill kernels (scalars or arrays), in the order of the kernel signatures
     if fly_time is None:
-        fly_time = calc_fly_time(
-            distance=attacker['distance'],
-            projectile_speed=attacker['weapon']['projectile']['speed']
-        )
+        fly_time = _fly_time(attacker, drag)
 
     ref_time = calc_refire_time(
         ref_time=attacker['weapon']['fire']['time_refire'],
@@ -25,7 +32,7 @@ def time_to_kill(attacker:dict, target:dict=None, fly_time=None, trace:bool=Fals
         dmg_min=attacker['weapon']['damage']['min'],
         range_max=attacker['weapon']['damage']['range_max'],
         range_min=attacker['weapon']['damage']['range_min'],
-        distance=0
+        distance=attacker['distance']
     )
 
     dmg_head = calc_damage_head(
@@ -33,7 +40,7 @@ def time_to_kill(attacker:dict, target:dict=None, fly_time=None, trace:bool=Fals
         dmg_multi_head=attacker['weapon']['damage']['multi_head']
     )
 
-    times, probs = calc_ttk_distribution(
+    kernel_args = dict(
         acc=attacker['skill']['accuracy'],
         hsr=attacker['skill']['headshot_ratio'],
         health_base=target['health']['base'],
@@ -47,47 +54,325 @@ def time_to_kill(attacker:dict, target:dict=None, fly_time=None, trace:bool=Fals
         resist_body=target['resist']['body'],
         heal_rate=target['heal']['rate'],
         clip_size=attacker['weapon']['ammo']['clip_size'],
-        overshield_decay=target['health']['shield_secondary_decay'],
-        cutoff=0.
+        overshield_decay=target['health']['shield_secondary_decay']
     )
+    return ref_time, kernel_args
+
+
+def _latencies(engagement:dict, fly_times=None) -> tuple:
+    # Travel times and latencies of both players, provided (e.g. ballistic) travel times or straight flight
+    fly_times = [None, None] if fly_times is None else list(fly_times)
+    latency = [0, 0]
+    for pl, player in enumerate((engagement['player_1'], engagement['player_2'])):
+        if fly_times[pl] is None:
+            fly_times[pl] = _fly_time(player)
+
+        latency[pl] = calc_latency(
+            technical_latency=player['technical']['latency'],
+            time_fly=fly_times[pl]
+        )
+    return fly_times, latency
+
+
+def time_to_kill(attacker:dict, target:dict=None, fly_time=None, trace:bool=False, method:str='auto', resolution:float=0.1,
+                 cutoff:float=0., epsilon:float=0., cache:bool=True):
+    if target is None:
+        target = attacker['player_2']
+        attacker = attacker['player_1']
+
+    # Simulated engagements include projectile drag in the travel time
+    ref_time, kernel_args = _kernel_args(attacker, target, fly_time, drag=method == 'monte_carlo')
+    kernel_args['clip_size'] = int(kernel_args['clip_size'])
+
+    # Probability mass dropped by pruning (only the sparse engine prunes)
+    discarded = 0.
+
+    # Without healing and overshield decay the distribution has a closed form
+    if method == 'auto':
+        is_static = kernel_args['heal_rate'] == 0 and kernel_args['overshield_decay'] == 0
+        method = 'closed' if is_static else 'sparse'
+
+    # Select engine for the kill probability distribution, deterministic engines are cached
+    if method in _ENGINE_OPTIONS:
+        options = {'resolution': resolution, 'cutoff': cutoff, 'epsilon': epsilon}
+        engine = _ttk_engine_cached if cache else _ttk_engine
+        with instrumentation.stage('time_to_kill'):
+            times, probs, discarded = engine(
+                method, **{k: options[k] for k in _ENGINE_OPTIONS[method]}, **kernel_args
+            )
+    elif method == 'monte_carlo':
+        weapon = attacker['weapon']
+        instrumentation.kernel('calc_ttk_monte_carlo')
+        times, probs = calc_ttk_monte_carlo(
+            **kernel_args,
+            distance=attacker['distance'],
+            cof_min=weapon['cof']['min'],
+            cof_max=weapon['cof']['max'],
+            cof_recoil=weapon['cof']['recoil'],
+            cof_scalar=weapon['cof']['scalar'],
+            recoil_horizontal_min=weapon['recoil']['horizontal_min'],
+            recoil_horizontal_max=weapon['recoil']['horizontal_max'],
+            recoil_first_shot_multi=weapon['recoil']['first_shot_multi'],
+            burst_count=weapon['fire']['burst_count'],
+            time_burst=weapon['fire']['time_auto_fire'],
+            pellets_per_shot=weapon['fire']['pellets_per_shot'],
+            pellet_spread=weapon['cof']['pellet_spread']
+        )
+    else:
+        raise ValueError(f'Unknown method for time to kill: {method}')
 
     if trace:
         utils.trace_wrapper(attacker, 'ref_time', ref_time)
-        utils.trace_wrapper(attacker, 'time_to_kill', list(times))
-        utils.trace_wrapper(attacker, 'kill_probability', list(probs))
+        utils.trace_wrapper(attacker, 'time_to_kill', times)
+        utils.trace_wrapper(attacker, 'kill_probability', probs)
+        if cutoff > 0 or epsilon > 0:
+            utils.trace_wrapper(attacker, 'discarded_probability', discarded)
 
     return times, probs
 
 
-def win_rate(engagement:dict, trace=False):
+# Options read by each deterministic engine besides the kernel arguments
+_ENGINE_OPTIONS = {
+    'closed': (),
+    'sparse': ('cutoff', 'epsilon'),
+    'grid': ('resolution',),
+}
+
+
+def _ttk_engine(method:str, **kwargs) -> tuple:
+    # Evaluates one deterministic engine, returns times, probabilities and discarded probability mass
+    if method == 'closed':
+        if kwargs.pop('heal_rate') != 0 or kwargs.pop('overshield_decay') != 0:
+            raise ValueError('Closed form time to kill requires no healing and no overshield decay')
+        instrumentation.kernel('calc_ttk_distribution_closed')
+        return (*calc_ttk_distribution_closed(**kwargs), 0.)
+    elif method == 'sparse':
+        instrumentation.kernel('calc_ttk_distribution_pruned')
+        times, probs, discarded, peak_states, n_shots = calc_ttk_distribution_pruned(**kwargs)
+        instrumentation.dp_stats(peak_states, n_shots)
+        return times, probs, discarded
+    else:
+        instrumentation.kernel('calc_ttk_distribution_grid')
+        return (*calc_ttk_distribution_grid(**kwargs), 0.)
+
+
+def _ttk_engine_readonly(method:str, **kwargs) -> tuple:
+    # Cached arrays are shared by all callers (and traces), writing to them raises instead of corrupting the cache
+    times, probs, discarded = _ttk_engine(method, **kwargs)
+    times.flags.writeable = False
+    probs.flags.writeable = False
+    return times, probs, discarded
+
+
+# Distributions keyed by engine, engine options and kernel arguments
+_ttk_engine_cached = functools.lru_cache(maxsize=constants.TTK_CACHE_SIZE)(_ttk_engine_readonly)
+
+
+def ttk_cache_info() -> dict:
+    """
+    Reports usage of the time to kill cache.
+
+    :return: Dictionary with hits, misses, current and maximum size and hit rate
+    """
+    info = _ttk_engine_cached.cache_info()
+    n_calls = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': info.hits / n_calls if n_calls else 0.,
+    }
+
+
+def ttk_cache_clear(maxsize:int=None):
+    """
+    Empties the time to kill cache and resets its counters.
+
+    :param maxsize: New maximum number of cached distributions, unchanged if not provided
+    :return: None
+    """
+    global _ttk_engine_cached
+    if maxsize is None:
+        _ttk_engine_cached.cache_clear()
+    else:
+        _ttk_engine_cached = functools.lru_cache(maxsize=maxsize)(_ttk_engine_readonly)
+
+
+def time_to_kill_error(attacker:dict, target:dict=None, method:str='grid', resolution:float=0.1) -> float:
+    """
+    Reports the error of an approximate time to kill engine against the exact sparse engine.
+
+    :param attacker: Parameter dictionary of the attacking player (or full engagement if target is None)
+    :param target: Parameter dictionary of the target player
+    :param method: Approximate engine to be checked
+    :param resolution: Health resolution of the grid engine
+    :return: Maximum absolute deviation of the cumulative kill probability
+    """
+    _, probs_exact = time_to_kill(attacker, target, method='sparse')
+    _, probs = time_to_kill(attacker, target, method=method, resolution=resolution)
+    return calc_distribution_error(probs_exact, probs)
+
+
+def time_to_kill_batch(attacker:dict, target:dict=None, fly_time=None, trace:bool=False, classes:bool=True):
+    """
+    Computes time to kill distributions for many parameter sets at once. Parameters are nested dictionaries like
+    for time_to_kill, with arrays (or scalars) as values that get broadcast against each other.
+
+    :param attacker: Parameter dictionary of the attacking player (or full engagement if target is None)
+    :param target: Parameter dictionary of the target player
+    :param fly_time: Array of bullet travel times, computed from distance if not provided
+    :param trace: Add results to the 'solution' entry of the attacker
+    :param classes: Evaluate the kernel once per class of parameter sets with identical distributions
+    :return: Padded 2D arrays of times to kill and kill probabilities, one row per parameter set
+    """
+    if target is None:
+        target = attacker['player_2']
+        attacker = attacker['player_1']
+
+    ref_time, kernel_args = _kernel_args(attacker, target, fly_time)
+    # Broadcast all kernel inputs to one array per input
+    kernel_args = np.broadcast_arrays(*[np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in kernel_args.values()])
+    # Contiguous arrays of the precompiled signatures (no copy if already contiguous), a kernel called with other
+    # layouts of broadcast views and table columns would be compiled again for every combination of layouts
+    kernel_args = [
+        np.ascontiguousarray(a, dtype=np.int64 if i == 12 else np.float64) for i, a in enumerate(kernel_args)
+    ]
+
+    with instrumentation.stage('time_to_kill'):
+        if classes:
+            times, probs = _ttk_batch_classes(kernel_args)
+        else:
+            times, probs = _ttk_batch(kernel_args)
+
+    if trace:
+        utils.trace_wrapper(attacker, 'ref_time', ref_time)
+        utils.trace_wrapper(attacker, 'time_to_kill', times)
+        utils.trace_wrapper(attacker, 'kill_probability', probs)
+
+    return times, probs
+
+
+# Parameter sets and kernel evaluations of time_to_kill_batch since the last reset
+_ttk_class_counts = {'parameter_sets': 0, 'kernel_calls': 0}
+
+
+def _ttk_batch_classes(kernel_args:list) -> tuple:
+    # Evaluates the batch kernel once per class of parameter sets with identical distributions
+    acc, hsr, hb, hs, ho, dh, db, tr, tf, rh, rb, heal, clip, decay = kernel_args
+    with instrumentation.stage('ttk_classes'):
+        instrumentation.kernel('calc_hit_staircase', len(acc))
+        staircase = calc_hit_staircase(hb, hs, ho, dh, db, rh, rb, clip)
+        # Without healing and overshield decay (and with positive body damage) the distribution only depends on the
+        # kill patterns, all other parameter sets are only grouped if all kernel arguments are equal
+        grouped = (heal == 0) & (decay == 0) & (db * (1 - rb) > 0)
+        key = np.column_stack([staircase, acc, hsr, tr, tf, clip] + [
+            np.where(grouped, 0., a) for a in (hb, hs, ho, dh, db, rh, rb, heal, decay)
+        ])
+        index, inverse = utils.unique_rows(key)
+    times, probs = _ttk_batch([a[index] for a in kernel_args])
+
+    _ttk_class_counts['parameter_sets'] += len(acc)
+    _ttk_class_counts['kernel_calls'] += len(index)
+    return times[inverse], probs[inverse]
+
+
+def _ttk_batch(kernel_args:list) -> tuple:
+    # Evaluates the batch kernel, with dynamic programming statistics if instrumentation is enabled
+    instrumentation.kernel('calc_ttk_distribution_batch', len(kernel_args[0]))
+    if not instrumentation.enabled():
+        return calc_ttk_distribution_batch(*kernel_args, 0.)
+    times, probs, stats = calc_ttk_distribution_batch_stats(*kernel_args, 0.)
+    # Rows computed in closed form have no statistics
+    is_dp = stats[:, 1] > 0
+    instrumentation.dp_stats(stats[is_dp, 0], stats[is_dp, 1])
+    return times, probs
+
+
+def ttk_class_info() -> dict:
+    """
+    Reports the kernel evaluations saved by grouping parameter sets into classes in time_to_kill_batch. Counts are
+    kept per process.
+
+    :return: Dictionary with the number of parameter sets, kernel calls and saved calls
+    """
+    return {
+        'parameter_sets': _ttk_class_counts['parameter_sets'],
+        'kernel_calls': _ttk_class_counts['kernel_calls'],
+        'saved': _ttk_class_counts['parameter_sets'] - _ttk_class_counts['kernel_calls'],
+    }
+
+
+def ttk_class_reset():
+    """
+    Resets the counters of ttk_class_info.
+
+    :return: None
+    """
+    _ttk_class_counts['parameter_sets'] = 0
+    _ttk_class_counts['kernel_calls'] = 0
+
+
+def win_rate(engagement:dict, trace=False, method:str='auto', resolution:float=0.1, epsilon:float=0., fly_times=None):
 
     players = [engagement['player_1'], engagement['player_2']]
-    latency = [0, 0]
+    fly_times, latency = _latencies(engagement, fly_times)
     times = [0, 0]
     probs = [0, 0]
     for pl in range(2):
-        fly_time = calc_fly_time(
-            distance=players[pl]['distance'],
-            projectile_speed=players[pl]['weapon']['projectile']['speed']
+        times[pl], probs[pl] = time_to_kill(
+            players[pl], players[1-pl], fly_times[pl], trace, method=method, resolution=resolution, epsilon=epsilon
         )
 
-        latency[pl] = calc_latency(
-            technical_latency=players[pl]['technical']['latency'],
-            time_fly=fly_time
+    with instrumentation.stage('win_rates'):
+        instrumentation.kernel('calc_win_rates')
+        win_rates = calc_win_rates(
+            times1=times[0],
+            probs1=probs[0],
+            times2=times[1],
+            probs2=probs[1],
+            latency1=latency[0],
+            latency2=latency[1]
         )
+    if trace:
+        utils.trace_wrapper(engagement, 'win_rates', win_rates)
+    return win_rates
 
-        times[pl], probs[pl] = time_to_kill(players[pl], players[1-pl], fly_time, trace)
 
-    win_rates = calc_win_rates(
-        times1=times[0],
-        probs1=probs[0],
-        times2=times[1],
-        probs2=probs[1],
-        latency1=latency[0],
-        latency2=latency[1]
-    )
+def win_rate_batch(engagement:dict, trace=False, fly_times=None):
+    """
+    Computes win rates for many engagements at once. Values of the engagement dictionary are arrays (or scalars)
+    that get broadcast against each other.
+
+    :param engagement: Nested dictionary with entries for player_1 and player_2
+    :param trace: Add results to the 'solution' entries of the engagement and players
+    :param fly_times: Arrays of bullet travel times per player, straight flight if not provided
+    :return: 2D array of draw, player 1 and player 2 win probabilities, one row per engagement
+    """
+    players = [engagement['player_1'], engagement['player_2']]
+    fly_times, latency = _latencies(engagement, fly_times)
+    times = [0, 0]
+    probs = [0, 0]
+    for pl in range(2):
+        times[pl], probs[pl] = time_to_kill_batch(players[pl], players[1-pl], fly_times[pl], trace)
+
+    # Bring both players to the same number of parameter sets, a single parameter set is broadcast
+    n_sets = max(len(times[0]), len(times[1]))
+    for pl in range(2):
+        if len(times[pl]) not in (1, n_sets):
+            raise ValueError(
+                f'Player {pl + 1} has {len(times[pl])} parameter sets, expected 1 or {n_sets} like the other player'
+            )
+        if len(times[pl]) < n_sets:
+            times[pl] = np.broadcast_to(times[pl], (n_sets, times[pl].shape[1]))
+            probs[pl] = np.broadcast_to(probs[pl], (n_sets, probs[pl].shape[1]))
+        latency[pl] = np.broadcast_to(np.asarray(latency[pl], dtype=np.float64), (n_sets,))
+
+    with instrumentation.stage('win_rates'):
+        instrumentation.kernel('calc_win_rates_batch', n_sets)
+        win_rates = calc_win_rates_batch(times[0], probs[0], times[1], probs[1], latency[0], latency[1])
     if trace:
-        utils.trace_wrapper(engagement, 'win_rates', list(win_rates))
+        utils.trace_wrapper(engagement, 'win_rates', win_rates)
     return win_rates
 
 
@@ -1,9 +1,29 @@
 import numba
+import numpy as np
 import math
 
 
-@numba.njit()
-def calc_ttk_distribution(
+# Kernel signatures compiled eagerly on import and cached on disk (see _SIGNATURES), arrays are C-contiguous.
+# Dispatchers stay open for other argument types (readonly, strided, float32 or int32 arrays), which are compiled
+# on first use. Scalar kernels release
+# the GIL, so they can run on threads in parallel.
+_f8 = numba.float64
+_i8 = numba.int64
+_vec = numba.float64[::1]
+_ivec = numba.int64[::1]
+_mat = numba.float64[:, ::1]
+SIG_TTK = (_f8,) * 12 + (_i8, _f8)
+SIG_TTK_CLOSED = (_f8,) * 11 + (_i8,)
+SIG_TTK_BATCH = (_vec,) * 12 + (_ivec, _vec)
+SIG_DISTRIBUTIONS = [(_vec,) * 4 + (_f8, _f8)]
+SIG_DISTRIBUTIONS_BATCH = (_mat,) * 4 + (_vec, _vec)
+SIG_STAIRCASE = (_vec,) * 7 + (_ivec,)
+
+
+@numba.njit(cache=True)
+def _ttk_sparse_into(
+        times: np.ndarray,
+        probs: np.ndarray,
         acc: float,
         hsr: float,
         health_base: float,
@@ -18,7 +38,8 @@ def calc_ttk_distribution(
         heal_rate: float,
         clip_size: int,
         overshield_decay: float,
-        cutoff: float = 0.
+        cutoff: float,
+        epsilon: float
 ):
     # Compute full initial health pool
     health_init: numba.float32 = health_base + health_shield + health_overshield
@@ -40,17 +61,25 @@ def calc_ttk_distribution(
         resist_body,
         resist_head
     ]
-    # Set up health and probability storage
-    time_to_kills = numba.typed.List.empty_list(item_type=numba.types.float64)
-    ttk_probs = numba.typed.List.empty_list(item_type=numba.types.float64)
+    # Set up health storage, kill probabilities are written into the first clip_size + 1 entries of the outputs
     healths = numba.typed.Dict.empty(key_type=numba.types.float64, value_type=numba.types.float64)
     # Set up initial values
     healths[health_init] = 1.
     time: numba.float32 = time_fly
+    # Probability mass of pruned health states
+    p_discarded = 0.
+    # Largest number of live health states and number of shots processed
+    peak_states = 1
+    n_shots = 0
     # Iterate through all shots
     for s in range(clip_size):
-        ttk_probs.append(0.)  # TODO: create full list beforehand
-        time_to_kills.append(time)
+        probs[s] = 0.
+        times[s] = time
+        # Target dead in all states -> remaining shots can't kill anymore
+        if len(healths) == 0:
+            time += time_refire
+            continue
+        n_shots += 1
         healths_new = numba.typed.Dict.empty(key_type=numba.types.float64, value_type=numba.types.float64)
         # Iterate through all health values
         for health, prob in healths.items():
@@ -70,10 +99,11 @@ def calc_ttk_distribution(
                 p_cur = p_cur * probs_step[j]
                 # Save probability and time if target dead
                 if h_cur <= 0:
-                    ttk_probs[s] += p_cur
+                    probs[s] += p_cur
                     continue
                 # Skip if probability below cutoff
                 if p_cur < cutoff:
+                    p_discarded += p_cur
                     continue
                 # Add healing
                 if h_cur < health_base:
@@ -87,6 +117,26 @@ def calc_ttk_distribution(
                     p_old = 0.
                 # Combine old and new probabilities of health values
                 healths_new[h_cur] = p_cur + p_old
+        # Prune least likely health states within the remaining error budget, spread over remaining shots
+        if epsilon > p_discarded and len(healths_new) > 1:
+            budget = (epsilon - p_discarded) / (clip_size - s)
+            h_vals = np.empty(len(healths_new))
+            p_vals = np.empty(len(healths_new))
+            for i, (health, prob) in enumerate(healths_new.items()):
+                h_vals[i] = health
+                p_vals[i] = prob
+            # Drop all states at once if their total mass fits into the remaining budget
+            if p_vals.sum() <= epsilon - p_discarded:
+                budget = epsilon - p_discarded
+            p_pruned = 0.
+            for i in np.argsort(p_vals):
+                if p_pruned + p_vals[i] > budget:
+                    break
+                p_pruned += p_vals[i]
+                healths_new.pop(h_vals[i])
+            p_discarded += p_pruned
+        if len(healths_new) > peak_states:
+            peak_states = len(healths_new)
         # Increase time
         time += time_refire
         # Update health storage
@@ -96,28 +146,512 @@ def calc_ttk_distribution(
     p_nokill = 0.
     for p in healths.values():
         p_nokill += p
-    ttk_probs.append(p_nokill)
-    time_to_kills.append(math.inf)
+    probs[clip_size] = p_nokill
+    times[clip_size] = math.inf
+    return p_discarded, peak_states, n_shots
+
+
+@numba.njit(cache=True)
+def _ttk_sparse(
+        acc, hsr, health_base, health_shield, health_overshield, dmg_head, dmg_body, time_refire, time_fly,
+        resist_head, resist_body, heal_rate, clip_size, overshield_decay, cutoff, epsilon
+):
+    # Preallocate outputs, one entry per shot plus the non-kill entry
+    times = np.empty(clip_size + 1)
+    probs = np.empty(clip_size + 1)
+    p_discarded, peak_states, n_shots = _ttk_sparse_into(
+        times, probs, acc, hsr, health_base, health_shield, health_overshield, dmg_head, dmg_body, time_refire,
+        time_fly, resist_head, resist_body, heal_rate, clip_size, overshield_decay, cutoff, epsilon
+    )
+    return times, probs, p_discarded, peak_states, n_shots
+
+
+@numba.njit(nogil=True, cache=True)
+def calc_ttk_distribution(
+        acc: float,
+        hsr: float,
+        health_base: float,
+        health_shield: float,
+        health_overshield: float,
+        dmg_head: float,
+        dmg_body: float,
+        time_refire: float,
+        time_fly: float,
+        resist_head: float,
+        resist_body: float,
+        heal_rate: float,
+        clip_size: int,
+        overshield_decay: float,
+        cutoff: float = 0.
+):
+    # Exact distribution, only states below the cutoff probability are dropped
+    time_to_kills, ttk_probs, _, _, _ = _ttk_sparse(
+        acc, hsr, health_base, health_shield, health_overshield, dmg_head, dmg_body, time_refire, time_fly,
+        resist_head, resist_body, heal_rate, clip_size, overshield_decay, cutoff, 0.
+    )
     return time_to_kills, ttk_probs
 
 
-@numba.njit()
-def calc_win_rates(times1, probs1, times2, probs2, latency1, latency2):
-    win_probs = numba.typed.List([0., 0., 0.])
-    for i in range(len(times1)):
-        sums = numba.typed.List([0., 0., 0.])
-        for j in range(len(times2)):
-            if times2[j] > times1[i] + latency2:
-                sums[1] += probs2[j]
-            elif times2[j] < times1[i] - latency1:
-                sums[2] += probs2[j]
-            else:
-                sums[0] += probs2[j]
+@numba.njit(nogil=True, cache=True)
+def calc_ttk_distribution_pruned(
+        acc: float,
+        hsr: float,
+        health_base: float,
+        health_shield: float,
+        health_overshield: float,
+        dmg_head: float,
+        dmg_body: float,
+        time_refire: float,
+        time_fly: float,
+        resist_head: float,
+        resist_body: float,
+        heal_rate: float,
+        clip_size: int,
+        overshield_decay: float,
+        epsilon: float,
+        cutoff: float = 0.
+):
+    # Distribution with adaptively pruned health states, discarded probability mass stays below epsilon. Also returns
+    # the discarded mass, the largest number of live health states and the number of shots processed.
+    return _ttk_sparse(
+        acc, hsr, health_base, health_shield, health_overshield, dmg_head, dmg_body, time_refire, time_fly,
+        resist_head, resist_body, heal_rate, clip_size, overshield_decay, cutoff, epsilon
+    )
+
+
+@numba.njit(cache=True)
+def _ttk_closed_into(
+        times, probs, acc, hsr, health_base, health_shield, health_overshield, dmg_head, dmg_body, time_refire,
+        time_fly, resist_head, resist_body, clip_size
+):
+    # Without healing and overshield decay only the number of body and head hits decides about a kill
+    health_init = health_base + health_shield + health_overshield
+    dmg_body_eff = dmg_body * (1 - resist_body)
+    dmg_head_eff = dmg_head * (1 - resist_head)
+    # Hits before the kill shot can't exceed the clip, stop early once every hit pattern is a kill
+    n_hits = clip_size
+    if dmg_body_eff > 0 and dmg_head_eff > 0:
+        n_hits = min(clip_size, int(math.ceil(health_init / min(dmg_body_eff, dmg_head_eff))) + 1)
+    # Probability of surviving k hits (alive) and of the next hit being the kill shot (kill)
+    alive = np.zeros(n_hits + 1)
+    kill = np.zeros(n_hits + 1)
+    # Distribution of head hits among k hits, built up hit by hit
+    heads = np.zeros(n_hits + 1)
+    heads[0] = 1.
+    for k in range(n_hits + 1):
+        if k > 0:
+            for y in range(k, 0, -1):
+                heads[y] = heads[y] * (1 - hsr) + heads[y - 1] * hsr
+            heads[0] *= 1 - hsr
+        for y in range(k + 1):
+            x = k - y
+            # Skip hit patterns that have already killed the target
+            if health_init - x * dmg_body_eff - y * dmg_head_eff <= 0:
+                continue
+            alive[k] += heads[y]
+            if health_init - (x + 1) * dmg_body_eff - y * dmg_head_eff <= 0:
+                kill[k] += heads[y] * acc * (1 - hsr)
+            if health_init - x * dmg_body_eff - (y + 1) * dmg_head_eff <= 0:
+                kill[k] += heads[y] * acc * hsr
+    # Distribution of hits among fired shots, advanced shot by shot for all hit counts at once
+    hits = np.zeros(n_hits + 1)
+    hits[0] = 1.
+    time = time_fly
+    for s in range(clip_size):
+        times[s] = time
+        # Scalar loops avoid temporary arrays, hits are updated in place from the top
+        prob = 0.
+        for k in range(n_hits + 1):
+            prob += hits[k] * kill[k]
+        probs[s] = prob
+        for k in range(n_hits, 0, -1):
+            hits[k] = hits[k] * (1 - acc) + hits[k - 1] * acc
+        hits[0] *= 1 - acc
+        time += time_refire
+
+    # Sum up remaining probabilities for non-kills
+    prob = 0.
+    for k in range(n_hits + 1):
+        prob += hits[k] * alive[k]
+    probs[clip_size] = prob
+    times[clip_size] = math.inf
+
+
+@numba.njit(nogil=True, cache=True)
+def calc_ttk_distribution_closed(
+        acc: float,
+        hsr: float,
+        health_base: float,
+        health_shield: float,
+        health_overshield: float,
+        dmg_head: float,
+        dmg_body: float,
+        time_refire: float,
+        time_fly: float,
+        resist_head: float,
+        resist_body: float,
+        clip_size: int
+):
+    # Fill preallocated arrays with the closed form distribution
+    times = np.empty(clip_size + 1)
+    probs = np.empty(clip_size + 1)
+    _ttk_closed_into(
+        times, probs, acc, hsr, health_base, health_shield, health_overshield, dmg_head, dmg_body, time_refire,
+        time_fly, resist_head, resist_body, clip_size
+    )
+    return times, probs
+
+
+# Values within this many grid steps of a grid point count as on the grid (floating point noise of the division)
+GRID_TOLERANCE = 1e-9
+
+
+@numba.njit(cache=True)
+def _grid_floor(steps):
+    return int(math.floor(steps + GRID_TOLERANCE))
+
+
+@numba.njit(cache=True)
+def _grid_ceil(steps):
+    return int(math.ceil(steps - GRID_TOLERANCE))
+
+
+# Resolution has no default: the dispatcher types omitted arguments once for all kernels, so an omitted 0.1 would be
+# matched against the omitted 0. of the other kernels and fail depending on the call order
+@numba.njit(nogil=True, cache=True)
+def calc_ttk_distribution_grid(
+        acc: float,
+        hsr: float,
+        health_base: float,
+        health_shield: float,
+        health_overshield: float,
+        dmg_head: float,
+        dmg_body: float,
+        time_refire: float,
+        time_fly: float,
+        resist_head: float,
+        resist_body: float,
+        heal_rate: float,
+        clip_size: int,
+        overshield_decay: float,
+        resolution: float
+):
+    # Discretize to grid steps of the given resolution. Rounding is conservative, health pools and healing round up,
+    # damage and overshield decay round down: the target never dies earlier than with exact health, kill breakpoints
+    # shift by at most one shot per step of rounding error. Exact for inputs on the grid.
+    n_init = _grid_ceil((health_base + health_shield + health_overshield) / resolution)
+    n_base = _grid_ceil(health_base / resolution)
+    n_overshield = n_init - _grid_floor(health_overshield / resolution)
+    # Discretize per-shot changes of health
+    n_decay = _grid_floor(overshield_decay * time_refire / resolution)
+    n_heal = _grid_ceil(heal_rate * time_refire / resolution)
+    # Set up probabilities and discretized damages for events (miss, body hit, head hit)
+    probs_step = np.array([1 - acc, acc * (1 - hsr), acc * hsr])
+    dmg_steps = np.array([
+        0,
+        _grid_floor(dmg_body * (1 - resist_body) / resolution),
+        _grid_floor(dmg_head * (1 - resist_head) / resolution)
+    ])
+    # Set up time and probability storage, one entry per shot plus the non-kill entry
+    time_to_kills = np.empty(clip_size + 1)
+    ttk_probs = np.empty(clip_size + 1)
+    # Fixed-size health vectors, index is health in grid steps (index 0 is dead)
+    healths = np.zeros(n_init + 1)
+    healths_dmg = np.zeros(n_init + 1)
+    healths_new = np.zeros(n_init + 1)
+    healths[n_init] = 1.
+    # Range of health indices that can hold probability mass
+    h_low = n_init
+    h_high = n_init
+    time = time_fly
+    # Iterate through all shots
+    for s in range(clip_size):
+        time_to_kills[s] = time
+        p_kill = 0.
+        # Subtract overshield decay by moving mass above the overshield threshold down
+        healths_dmg[:] = 0.
+        healths_dmg[h_low:h_high + 1] = healths[h_low:h_high + 1]
+        if n_decay > 0 and h_high > n_overshield:
+            h_start = max(h_low, n_overshield + 1)
+            healths_dmg[h_start:h_high + 1] = 0.
+            for h in range(h_start, h_high + 1):
+                healths_dmg[max(h - n_decay, n_overshield)] += healths[h]
+            h_high = max(h_high - n_decay, n_overshield)
+            h_low = min(h_low, max(h_start - n_decay, n_overshield))
+        # Apply every event as a shifted add of the health vector
+        healths_new[:] = 0.
         for j in range(3):
-            win_probs[j] += probs1[i] * sums[j]
+            d = dmg_steps[j]
+            p = probs_step[j]
+            # Health values that drop to or below zero are kills
+            h_dead = min(d, h_high)
+            if h_dead >= h_low:
+                p_kill += p * healths_dmg[h_low:h_dead + 1].sum()
+            # Surviving health values are shifted down by the damage
+            h_start = max(h_low, d + 1)
+            if h_start <= h_high:
+                healths_new[h_start - d:h_high - d + 1] += p * healths_dmg[h_start:h_high + 1]
+        h_low = max(h_low - dmg_steps.max(), 1)
+        # Add healing by moving mass below the base health up
+        if n_heal > 0 and h_low < n_base:
+            h_end = min(h_high, n_base - 1)
+            healths_dmg[h_low:h_end + 1] = healths_new[h_low:h_end + 1]
+            healths_new[h_low:h_end + 1] = 0.
+            for h in range(h_low, h_end + 1):
+                healths_new[min(h + n_heal, n_base)] += healths_dmg[h]
+            h_high = max(h_high, min(h_end + n_heal, n_base))
+            h_low = min(h_low + n_heal, n_base)
+        ttk_probs[s] = p_kill
+        # Increase time
+        time += time_refire
+        # Update health storage
+        healths, healths_new = healths_new, healths
+
+    # Sum up remaining probabilities for non-kills
+    ttk_probs[clip_size] = healths[h_low:h_high + 1].sum()
+    time_to_kills[clip_size] = math.inf
+    return time_to_kills, ttk_probs
+
+
+@numba.njit(parallel=True, cache=True)
+def _ttk_batch(
+        acc: np.ndarray,
+        hsr: np.ndarray,
+        health_base: np.ndarray,
+        health_shield: np.ndarray,
+        health_overshield: np.ndarray,
+        dmg_head: np.ndarray,
+        dmg_body: np.ndarray,
+        time_refire: np.ndarray,
+        time_fly: np.ndarray,
+        resist_head: np.ndarray,
+        resist_body: np.ndarray,
+        heal_rate: np.ndarray,
+        clip_size: np.ndarray,
+        overshield_decay: np.ndarray,
+        cutoff: float,
+        stats: np.ndarray
+):
+    # Number of parameter sets and width of padded output
+    n_sets = len(acc)
+    n_cols = 1
+    for i in range(n_sets):
+        if clip_size[i] + 1 > n_cols:
+            n_cols = clip_size[i] + 1
+    # Pad times with infinity and probabilities with zero to keep rows sorted and normalized
+    times = np.full((n_sets, n_cols), math.inf)
+    probs = np.zeros((n_sets, n_cols))
+    # Distribute parameter sets across cores
+    for i in numba.prange(n_sets):
+        # Use closed form where neither healing nor overshield decay is present, written directly into the row
+        if heal_rate[i] == 0 and overshield_decay[i] == 0:
+            _ttk_closed_into(
+                times[i], probs[i], acc[i], hsr[i], health_base[i], health_shield[i], health_overshield[i],
+                dmg_head[i], dmg_body[i], time_refire[i], time_fly[i], resist_head[i], resist_body[i], clip_size[i]
+            )
+            continue
+        # Dynamic programming otherwise, also written directly into the row
+        _, peak_states, n_shots = _ttk_sparse_into(
+            times[i], probs[i], acc[i], hsr[i], health_base[i], health_shield[i], health_overshield[i], dmg_head[i],
+            dmg_body[i], time_refire[i], time_fly[i], resist_head[i], resist_body[i], heal_rate[i], clip_size[i],
+            overshield_decay[i], cutoff, 0.
+        )
+        # Statistics of the dynamic programming rows, only if requested (one row per parameter set)
+        if len(stats) > 0:
+            stats[i, 0] = peak_states
+            stats[i, 1] = n_shots
+    return times, probs
+
+
+@numba.njit(cache=True)
+def calc_ttk_distribution_batch(
+        acc: np.ndarray,
+        hsr: np.ndarray,
+        health_base: np.ndarray,
+        health_shield: np.ndarray,
+        health_overshield: np.ndarray,
+        dmg_head: np.ndarray,
+        dmg_body: np.ndarray,
+        time_refire: np.ndarray,
+        time_fly: np.ndarray,
+        resist_head: np.ndarray,
+        resist_body: np.ndarray,
+        heal_rate: np.ndarray,
+        clip_size: np.ndarray,
+        overshield_decay: np.ndarray,
+        cutoff: float = 0.
+):
+    return _ttk_batch(
+        acc, hsr, health_base, health_shield, health_overshield, dmg_head, dmg_body, time_refire, time_fly,
+        resist_head, resist_body, heal_rate, clip_size, overshield_decay, cutoff, np.zeros((0, 2), dtype=np.int64)
+    )
+
+
+@numba.njit(cache=True)
+def calc_ttk_distribution_batch_stats(
+        acc: np.ndarray,
+        hsr: np.ndarray,
+        health_base: np.ndarray,
+        health_shield: np.ndarray,
+        health_overshield: np.ndarray,
+        dmg_head: np.ndarray,
+        dmg_body: np.ndarray,
+        time_refire: np.ndarray,
+        time_fly: np.ndarray,
+        resist_head: np.ndarray,
+        resist_body: np.ndarray,
+        heal_rate: np.ndarray,
+        clip_size: np.ndarray,
+        overshield_decay: np.ndarray,
+        cutoff: float
+):
+    # Like calc_ttk_distribution_batch, additionally returns the largest number of live health states and the number
+    # of shots processed per parameter set (zero for rows computed in closed form)
+    stats = np.zeros((len(acc), 2), dtype=np.int64)
+    times, probs = _ttk_batch(
+        acc, hsr, health_base, health_shield, health_overshield, dmg_head, dmg_body, time_refire, time_fly,
+        resist_head, resist_body, heal_rate, clip_size, overshield_decay, cutoff, stats
+    )
+    return times, probs, stats
+
+
+@numba.njit(parallel=True, cache=True)
+def calc_hit_staircase(
+        health_base: np.ndarray,
+        health_shield: np.ndarray,
+        health_overshield: np.ndarray,
+        dmg_head: np.ndarray,
+        dmg_body: np.ndarray,
+        resist_head: np.ndarray,
+        resist_body: np.ndarray,
+        clip_size: np.ndarray
+):
+    # Minimal number of body hits for a kill per number of head hits, with the same comparison as the closed form.
+    # Without healing and overshield decay two parameter sets with equal staircases share the kill patterns.
+    n_sets = len(health_base)
+    n_cols = 1
+    for i in range(n_sets):
+        if clip_size[i] + 2 > n_cols:
+            n_cols = clip_size[i] + 2
+    # Columns beyond the clip are padded with -1, clip + 2 marks head hit counts without kill in reach
+    staircase = np.full((n_sets, n_cols), -1, dtype=np.int64)
+    for i in numba.prange(n_sets):
+        health_init = health_base[i] + health_shield[i] + health_overshield[i]
+        dmg_body_eff = dmg_body[i] * (1 - resist_body[i])
+        dmg_head_eff = dmg_head[i] * (1 - resist_head[i])
+        x_max = clip_size[i] + 2
+        for y in range(clip_size[i] + 2):
+            health = health_init - y * dmg_head_eff
+            # Start from the estimate and correct it to the exact floating point comparison
+            if dmg_body_eff > 0:
+                x = int(min(max(math.ceil(health / dmg_body_eff), 0), x_max))
+            else:
+                x = 0
+            while x > 0 and health_init - (x - 1) * dmg_body_eff - y * dmg_head_eff <= 0:
+                x -= 1
+            while x < x_max and health_init - x * dmg_body_eff - y * dmg_head_eff > 0:
+                x += 1
+            staircase[i, y] = x
+    return staircase
+
+
+@numba.njit(cache=True)
+def _win_rates_sorted(times1, probs1, times2, probs2, latency1, latency2):
+    # Cumulative probabilities of second distribution, cdf2[j] is the mass of the first j times
+    cdf2 = np.zeros(len(times2) + 1)
+    cdf2[1:] = np.cumsum(probs2)
+    # Times of player 2 after the window of player 1 are wins, before the window are losses
+    idx_win = np.searchsorted(times2, times1 + latency2, side='right')
+    idx_lose = np.minimum(np.searchsorted(times2, times1 - latency1, side='left'), idx_win)
+    p_win = cdf2[-1] - cdf2[idx_win]
+    p_lose = cdf2[idx_lose]
+    p_draw = cdf2[idx_win] - cdf2[idx_lose]
+    return (probs1 * p_draw).sum(), (probs1 * p_win).sum(), (probs1 * p_lose).sum()
+
+
+@numba.njit(nogil=True, cache=True)
+def calc_win_rates(times1, probs1, times2, probs2, latency1, latency2):
+    # Both time arrays are sorted, so outcomes per time of player 1 follow from the cdf of player 2
+    win_probs = np.empty(3)
+    win_probs[0], win_probs[1], win_probs[2] = _win_rates_sorted(times1, probs1, times2, probs2, latency1, latency2)
+    return win_probs
+
+
+@numba.njit(parallel=True, cache=True)
+def calc_win_rates_batch(
+        times1: np.ndarray,
+        probs1: np.ndarray,
+        times2: np.ndarray,
+        probs2: np.ndarray,
+        latency1: np.ndarray,
+        latency2: np.ndarray
+):
+    # Rows are padded distributions as returned by calc_ttk_distribution_batch
+    n_sets = times1.shape[0]
+    win_probs = np.zeros((n_sets, 3))
+    for i in numba.prange(n_sets):
+        win_probs[i, 0], win_probs[i, 1], win_probs[i, 2] = _win_rates_sorted(
+            times1[i], probs1[i], times2[i], probs2[i], latency1[i], latency2[i]
+        )
     return win_probs
 
 
+@numba.njit(nogil=True, cache=True)
+def calc_distribution_error(probs1, probs2):
+    # Maximum absolute deviation between the cumulative kill probabilities of two distributions
+    cdf1 = 0.
+    cdf2 = 0.
+    error = 0.
+    for i in range(min(len(probs1), len(probs2))):
+        cdf1 += probs1[i]
+        cdf2 += probs2[i]
+        if abs(cdf1 - cdf2) > error:
+            error = abs(cdf1 - cdf2)
+    return error
+
+
+# Signatures per kernel compiled on import, loaded from the on-disk cache after the first run
+_SIGNATURES = {
+    calc_ttk_distribution: [SIG_TTK + (_f8,), SIG_TTK + (numba.types.Omitted(0.),)],
+    calc_ttk_distribution_pruned: [SIG_TTK + (_f8, _f8), SIG_TTK + (_f8, numba.types.Omitted(0.))],
+    calc_ttk_distribution_closed: [SIG_TTK_CLOSED],
+    calc_ttk_distribution_grid: [SIG_TTK + (_f8,)],
+    _ttk_batch: [SIG_TTK_BATCH + (_f8, numba.int64[:, ::1])],
+    calc_ttk_distribution_batch: [SIG_TTK_BATCH + (_f8,), SIG_TTK_BATCH + (numba.types.Omitted(0.),)],
+    calc_ttk_distribution_batch_stats: [SIG_TTK_BATCH + (_f8,)],
+    calc_hit_staircase: [SIG_STAIRCASE],
+    calc_win_rates: SIG_DISTRIBUTIONS,
+    calc_win_rates_batch: [SIG_DISTRIBUTIONS_BATCH],
+    calc_distribution_error: [(_vec, _vec)],
+}
+for _kernel, _signatures in _SIGNATURES.items():
+    for _signature in _signatures:
+        _kernel.compile(_signature)
+
+
+def warmup():
+    """
+    Runs every kernel once on a minimal input. Loads compiled kernels from the on-disk cache and starts the
+    thread pool of the parallel kernels, so the first real query doesn't pay for it.
+
+    :return: None
+    """
+    args = (0.5, 0.5, 1., 1., 0., 2., 1., 0.1, 0., 0., 0.)
+    times, probs = calc_ttk_distribution(*args, 0., 1, 0., 0.)
+    calc_ttk_distribution_pruned(*args, 0., 1, 0., 0., 0.)
+    calc_ttk_distribution_closed(*args, 1)
+    calc_ttk_distribution_grid(*args, 0., 1, 0., 1.)
+    calc_win_rates(times, probs, times, probs, 0., 0.)
+    calc_distribution_error(probs, probs)
+    # Batched kernels on a single parameter set
+    arrays = [np.array([a]) for a in args + (0.,)]
+    times_batch, probs_batch = calc_ttk_distribution_batch(*arrays, np.array([1]), np.array([0.]), 0.)
+    calc_ttk_distribution_batch_stats(*arrays, np.array([1]), np.array([0.]), 0.)
+    calc_win_rates_batch(times_batch, probs_batch, times_batch, probs_batch, np.zeros(1), np.zeros(1))
+    calc_win_rates(times_batch[0], probs_batch[0], times_batch[0], probs_batch[0], 0., 0.)
+    calc_hit_staircase(*arrays[2:7], *arrays[9:11], np.array([1]))
+
+
 
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -0,0 +1,200 @@
+import math
+import numpy as np
+import constants
+from concurrent.futures import ThreadPoolExecutor
+
+
+"""
+Monte Carlo engine for engagement mechanics that the analytic kernels can't model (cone of fire, recoil, bursts,
+pellets). Simulates many engagements at once as arrays of trials, advanced shot by shot.
+"""
+
+
+def calc_shot_times(time_refire:float, time_fly:float, clip_size:int, burst_count:int=1, time_burst:float=0.) -> np.ndarray:
+    """
+    Returns the time at which every shot of a clip hits the target, followed by infinity for no kill.
+
+    :param time_refire: Time between shots [s]
+    :param time_fly: Travel time of a bullet [s]
+    :param clip_size: Number of shots
+    :param burst_count: Number of shots per burst
+    :param time_burst: Additional delay between bursts [s]
+    :return: Array of length clip_size + 1
+    """
+    shots = np.arange(clip_size)
+    times = time_fly + shots * time_refire + (shots // max(int(burst_count), 1)) * time_burst
+    return np.append(times, math.inf)
+
+
+def simulate_kill_shots(rng:np.random.Generator, n_trials:int, params:dict) -> np.ndarray:
+    """
+    Simulates a batch of engagements and returns the index of the killing shot for every trial.
+
+    :param rng: Random number generator of the calling worker
+    :param n_trials: Number of simulated engagements
+    :param params: Engagement parameters as prepared by calc_ttk_monte_carlo
+    :return: Array of kill shot indices, clip_size for trials without kill
+    """
+    clip_size = params['clip_size']
+    health_init = params['health_init']
+    health_threshold = health_init - params['health_overshield']
+    # Per trial storage, only trials with a living target are kept
+    kill_shots = np.full(n_trials, clip_size)
+    trials = np.arange(n_trials)
+    health = np.full(n_trials, health_init)
+    kick = 0.
+    for s in range(clip_size):
+        n_alive = len(trials)
+        # Single draw decides between miss, body aim and head aim
+        u = rng.random(n_alive, dtype=np.float32)
+        aim_hit = u < params['acc']
+        aim_head = u < params['acc'] * params['hsr']
+        # Cone of fire and recoil offsets decide whether pellets land in the hit zones
+        cone = params['cones'][s]
+        if cone > 0 or params['has_recoil']:
+            dmg = np.zeros(n_alive)
+            for _ in range(params['pellets_per_shot']):
+                # Squared distance from the aim point, uniformly distributed within the cone and shifted by recoil
+                offset_sq = cone ** 2 * rng.random(n_alive, dtype=np.float32)
+                if params['has_recoil']:
+                    angle = 2 * math.pi * rng.random(n_alive, dtype=np.float32)
+                    offset_sq += kick ** 2 + 2 * kick * np.sqrt(offset_sq) * np.cos(angle)
+                hit_head = aim_head & (offset_sq <= constants.TARGET_RADIUS_HEAD ** 2)
+                hit_body = aim_hit & ~hit_head & (offset_sq <= constants.TARGET_RADIUS_BODY ** 2)
+                dmg += hit_head * params['dmg_head'] + hit_body * params['dmg_body']
+        else:
+            dmg = np.where(aim_head, params['dmg_head'], np.where(aim_hit, params['dmg_body'], 0.))
+            dmg *= params['pellets_per_shot']
+        # Subtract overshield decay
+        if params['decays'][s] > 0:
+            above = health > health_threshold
+            health[above] = np.maximum(health[above] - params['decays'][s], health_threshold)
+        # Apply damage and record kills
+        health -= dmg
+        dead = health <= 0
+        kill_shots[trials[dead]] = s
+        alive = ~dead
+        trials = trials[alive]
+        health = health[alive]
+        if len(trials) == 0:
+            break
+        # Add healing
+        if params['heals'][s] > 0:
+            healed = np.minimum(health + params['heals'][s], params['health_base'])
+            health = np.where(health < params['health_base'], healed, health)
+        # Horizontal recoil of the current shot displaces the next one
+        if params['has_recoil']:
+            # Sign and magnitude of the kick from a single draw
+            kick = rng.uniform(-1., 1., len(trials))
+            kick = np.sign(kick) * (params['recoil_min'] + np.abs(kick) * (params['recoil_max'] - params['recoil_min']))
+            kick *= params['recoil_first_multi'] if s == 0 else 1.
+            kick = params['distance'] * np.tan(np.radians(kick))
+    return kill_shots
+
+
+def calc_ttk_monte_carlo(
+        acc: float,
+        hsr: float,
+        health_base: float,
+        health_shield: float,
+        health_overshield: float,
+        dmg_head: float,
+        dmg_body: float,
+        time_refire: float,
+        time_fly: float,
+        resist_head: float,
+        resist_body: float,
+        heal_rate: float,
+        clip_size: int,
+        overshield_decay: float,
+        distance: float = 0.,
+        cof_min: float = 0.,
+        cof_max: float = 0.,
+        cof_recoil: float = 0.,
+        cof_scalar: float = 0.,
+        recoil_horizontal_min: float = 0.,
+        recoil_horizontal_max: float = 0.,
+        recoil_first_shot_multi: float = 0.,
+        burst_count: int = 1,
+        time_burst: float = 0.,
+        pellets_per_shot: int = 1,
+        pellet_spread: float = 0.,
+        seed: int = 0,
+        workers: int = 1,
+        tol: float = 1e-3,
+        batch_size: int = 100_000,
+        max_trials: int = 10_000_000
+):
+    """
+    Estimates the time to kill distribution by simulating engagements. Runs batches of trials on every worker until
+    the standard error of all kill probabilities is below the tolerance.
+
+    :param distance: Distance to the target [m]
+    :param cof_min: Cone of fire of the first shot [deg]
+    :param cof_max: Maximum cone of fire, 0 for no limit [deg]
+    :param cof_recoil: Cone of fire bloom per shot [deg]
+    :param cof_scalar: Multiplier of the cone of fire, 0 for none
+    :param recoil_horizontal_min: Minimum horizontal recoil kick [deg]
+    :param recoil_horizontal_max: Maximum horizontal recoil kick [deg]
+    :param recoil_first_shot_multi: Multiplier of the first recoil kick, 0 for none
+    :param burst_count: Number of shots per burst
+    :param time_burst: Additional delay between bursts [s]
+    :param pellets_per_shot: Number of pellets per shot, damage values are per pellet
+    :param pellet_spread: Additional cone of fire of pellets [deg]
+    :param seed: Seed of the random streams, every worker gets an independent stream spawned from it
+    :param workers: Number of threads simulating batches in parallel
+    :param tol: Tolerated standard error of every kill probability
+    :param batch_size: Number of trials per batch and worker
+    :param max_trials: Upper limit of simulated trials
+    :return: Times to kill and kill probabilities, same layout as calc_ttk_distribution
+    """
+    clip_size = int(clip_size)
+    burst_count = max(int(burst_count), 1)
+    times = calc_shot_times(time_refire, time_fly, clip_size, burst_count, time_burst)
+    # Time until the next shot for healing and overshield decay
+    intervals = np.diff(times[:-1], append=times[-2] + time_refire)
+    # Cone of fire grows with every shot [deg], converted to a radius at the target [m]
+    cones = cof_min + cof_recoil * np.arange(clip_size)
+    if cof_max > 0:
+        cones = np.minimum(cones, cof_max)
+    cones = (cones * (cof_scalar if cof_scalar > 0 else 1.) + (pellet_spread if pellets_per_shot > 1 else 0.))
+    cones = distance * np.tan(np.radians(cones))
+    params = {
+        'acc': acc,
+        'hsr': hsr,
+        'health_init': float(health_base + health_shield + health_overshield),
+        'health_base': health_base,
+        'health_overshield': health_overshield,
+        'dmg_head': dmg_head * (1 - resist_head),
+        'dmg_body': dmg_body * (1 - resist_body),
+        'clip_size': clip_size,
+        'pellets_per_shot': max(int(pellets_per_shot), 1),
+        'cones': cones,
+        'decays': overshield_decay * intervals,
+        'heals': heal_rate * intervals,
+        'distance': distance,
+        'has_recoil': distance > 0 and recoil_horizontal_max > 0,
+        'recoil_min': recoil_horizontal_min,
+        'recoil_max': recoil_horizontal_max,
+        'recoil_first_multi': recoil_first_shot_multi if recoil_first_shot_multi > 0 else 1.,
+    }
+    # Independent random streams per worker
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(workers)]
+    counts = np.zeros(clip_size + 1)
+    n_trials = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while n_trials < max_trials:
+            # Simulate one batch per worker
+            n_batch = min(batch_size, -(-(max_trials - n_trials) // workers))
+            for kill_shots in executor.map(lambda rng: simulate_kill_shots(rng, n_batch, params), rngs):
+                counts += np.bincount(kill_shots, minlength=clip_size + 1)
+            n_trials += n_batch * workers
+            # Stop once the largest standard error is within tolerance
+            probs = counts / n_trials
+            if np.sqrt(probs * (1 - probs) / n_trials).max() <= tol:
+                break
+    return times, counts / n_trials
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,165 @@
+import numpy as np
+from collections.abc import Mapping
+
+
+"""
+Containers for simulation results. Scalar outputs are stored as NumPy columns, variable-length distributions as one
+flat value array plus row offsets.
+"""
+
+
+class RaggedArray:
+    """
+    Sequence of 1D float arrays of different length, stored as one flat value array and row offsets. Row i is the
+    view values[offsets[i]:offsets[i + 1]]. Rows can be appended, the buffers grow geometrically.
+    """
+
+    def __init__(self, values:np.ndarray=None, offsets:np.ndarray=None):
+        if values is None:
+            values = np.empty(0)
+            offsets = np.zeros(1, dtype=np.int64)
+        self._values = values
+        self._offsets = offsets
+        self._n_values = int(offsets[-1])
+        self._n_rows = len(offsets) - 1
+
+    @classmethod
+    def from_padded(cls, padded:np.ndarray, lengths:np.ndarray):
+        """
+        Creates ragged array from the rows of a padded 2D array.
+
+        :param padded: 2D array, row i holds lengths[i] values followed by padding
+        :param lengths: Number of values per row
+        :return: Ragged array
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Mask of the leading entries of every row
+        mask = np.arange(padded.shape[1]) < lengths[:, None]
+        return cls(padded[mask], offsets)
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self._n_values]
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._offsets[:self._n_rows + 1]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self._values.nbytes + self._offsets.nbytes
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def __getitem__(self, item):
+        # Slice -> ragged array sharing the values (exactly filled, so appending to it copies)
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self._n_rows)
+            if step != 1:
+                raise ValueError('Ragged array only supports contiguous slices')
+            stop = max(start, stop)
+            first, last = self._offsets[start], self._offsets[stop]
+            return RaggedArray(self._values[first:last], self._offsets[start:stop + 1] - first)
+        # Index -> view of the row
+        if item < 0:
+            item += self._n_rows
+        if not 0 <= item < self._n_rows:
+            raise IndexError('Ragged array index out of range')
+        return self._values[self._offsets[item]:self._offsets[item + 1]]
+
+    def __iter__(self):
+        for i in range(self._n_rows):
+            yield self[i]
+
+    def append(self, row):
+        """
+        Adds a row at the end.
+
+        :param row: Sequence of floats
+        :return: None
+        """
+        row = np.asarray(row, dtype=np.float64)
+        # Grow buffers geometrically to keep appends amortized constant
+        if self._n_values + len(row) > len(self._values):
+            self._values = self._grow(self._values, self._n_values + len(row))
+        if self._n_rows + 2 > len(self._offsets):
+            self._offsets = self._grow(self._offsets, self._n_rows + 2)
+        self._values[self._n_values:self._n_values + len(row)] = row
+        self._n_values += len(row)
+        self._n_rows += 1
+        self._offsets[self._n_rows] = self._n_values
+
+    def compact(self):
+        """
+        Releases unused buffer capacity.
+
+        :return: None
+        """
+        self._values = self.values.copy()
+        self._offsets = self.offsets.copy()
+
+    def padded(self, fill:float=np.nan) -> np.ndarray:
+        """
+        Returns the rows as padded 2D array (copy).
+
+        :param fill: Value of the padding
+        :return: 2D array with one row per row of the ragged array
+        """
+        lengths = self.lengths
+        padded = np.full((self._n_rows, lengths.max(initial=0)), fill)
+        padded[np.arange(padded.shape[1]) < lengths[:, None]] = self.values
+        return padded
+
+    @staticmethod
+    def _grow(buffer:np.ndarray, size:int) -> np.ndarray:
+        grown = np.empty(max(size, 2 * len(buffer)), dtype=buffer.dtype)
+        grown[:len(buffer)] = buffer
+        return grown
+
+
+class Results(Mapping):
+    """
+    Nested, read-only mapping of simulation results. Leaves are NumPy arrays (one entry or row per engagement) or
+    ragged arrays for distributions. Sub-dictionaries are returned as Results, so paths can be followed like for the
+    nested dictionaries of the scalar functions.
+    """
+
+    def __init__(self, columns:dict):
+        self._columns = columns
+
+    def __getitem__(self, key):
+        value = self._columns[key]
+        if isinstance(value, dict):
+            return Results(value)
+        return value
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory held by the leaves. Parameter columns that are views of one table count with their own size only.
+        """
+        return sum(value.nbytes for value in self._leaves())
+
+    def _leaves(self):
+        for value in self._columns.values():
+            if isinstance(value, dict):
+                yield from Results(value)._leaves()
+            else:
+                yield value
+
+
+if __name__ == '__main__':
+    pass
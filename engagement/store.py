@@ -0,0 +1,306 @@
+import os
+import json
+import numpy as np
+from collections.abc import Mapping
+from engagement.results import RaggedArray
+
+
+"""
+On-disk columnar store for sweep results. Every solution column is a memory-mapped .npy file, distributions are
+stored as flat values plus offsets. Parameter columns are not stored: the JSON schema holds their values and
+mixed-radix position in the sweep, they are recomputed from the row index for the rows that are accessed.
+"""
+
+
+SCHEMA_FILE = 'schema.json'
+# Rows per block when iterating over a parameter column
+CHUNK_ROWS = 65_536
+
+
+class ParameterColumn:
+    """
+    Read-only parameter column of a result store. Values are computed from the row indices when indexed, only the
+    requested rows are materialized. np.asarray(column) creates the full column.
+    """
+    values: np.ndarray
+    size: int
+    stride: int
+    start: int
+
+    def __init__(self, values:np.ndarray, size:int, stride:int, start:int, n_rows:int):
+        self.values = values
+        self.size = size
+        self.stride = stride
+        # Row of the sweep space of the first row of the column
+        self.start = start
+        self._n_rows = n_rows
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.values.dtype
+
+    @property
+    def shape(self) -> tuple:
+        return self._n_rows,
+
+    @property
+    def ndim(self) -> int:
+        return 1
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def __getitem__(self, item):
+        # Slice -> values of the rows in the slice
+        if isinstance(item, slice):
+            return self._rows(np.arange(*item.indices(self._n_rows)))
+        # Index arrays and boolean masks -> values of the selected rows
+        if isinstance(item, (list, tuple, np.ndarray)):
+            rows = np.asarray(item)
+            if rows.dtype == bool:
+                if rows.shape != self.shape:
+                    raise IndexError('Boolean index does not match the length of the parameter column')
+                rows = np.flatnonzero(rows)
+            rows = np.where(rows < 0, rows + self._n_rows, rows)
+            if np.any((rows < 0) | (rows >= self._n_rows)):
+                raise IndexError('Parameter column index out of range')
+            return self._rows(rows)
+        # Index -> value of the row
+        if item < 0:
+            item += self._n_rows
+        if not 0 <= item < self._n_rows:
+            raise IndexError('Parameter column index out of range')
+        return self.values[((self.start + item) // self.stride) % self.size]
+
+    def __iter__(self):
+        # Rows are computed in blocks, memory stays bounded
+        for first in range(0, self._n_rows, CHUNK_ROWS):
+            yield from self[first:first + CHUNK_ROWS]
+
+    def __array__(self, dtype=None, copy=None):
+        column = self[:]
+        return column if dtype is None else column.astype(dtype)
+
+    def _rows(self, rows:np.ndarray) -> np.ndarray:
+        return self.values[((self.start + rows) // self.stride) % self.size]
+
+
+class ResultStore(Mapping):
+    """
+    Nested, read-only mapping over a result store directory, like Results. Columns are opened lazily (memory-mapped)
+    when accessed, so only the columns that are used get read from disk.
+    """
+    path: str
+
+    def __init__(self, path:str, prefix:tuple=(), schema:dict=None):
+        self.path = path
+        self._prefix = prefix
+        self._schema = schema if schema is not None else _read_schema(path)
+        self._files = {}
+
+    @classmethod
+    def create(cls, path:str, space, layout:list, chunk_size:int):
+        """
+        Creates a store for the results of a sweep space. Files are allocated with their final size and filled with
+        the initial values of the layout, rows are written later on chunk by chunk.
+
+        :param path: Directory of the store (created if not existing, existing columns are overwritten)
+        :param space: Sweep space of the results
+        :param layout: List of (path, shape, initial value, length path) of the solution columns. Columns with a
+            length path are padded distributions, stored with parameter value + 1 entries per row.
+        :param chunk_size: Number of rows per chunk of the sweep
+        :return: Store opened for writing
+        """
+        os.makedirs(path, exist_ok=True)
+        n_rows = len(space)
+        schema = {
+            'n_rows': n_rows,
+            'rows_written': 0,
+            'start': space.start,
+            'fingerprint': space.fingerprint(),
+            'chunk_size': chunk_size,
+            'chunks_done': [],
+            'parameters': {},
+            'solutions': {},
+        }
+        # Values and mixed-radix digit of the parameter columns
+        for (param_path, values), size, stride in zip(space.columns, space.sizes, space.strides):
+            schema['parameters']['.'.join(param_path)] = {
+                'values': np.asarray(values).tolist(),
+                'dtype': np.asarray(values).dtype.str,
+                'size': size,
+                'stride': stride,
+            }
+
+        for sol_path, shape, fill, length_path in layout:
+            name = '.'.join(sol_path)
+            if length_path is None:
+                column = np.lib.format.open_memmap(_file(path, name), 'w+', np.float64, shape)
+                column[...] = fill
+                schema['solutions'][name] = {'kind': 'array', 'shape': list(shape)}
+                continue
+            # Offsets of the rows follow from the parameter holding the row lengths
+            offsets = np.lib.format.open_memmap(_file(path, name + '.offsets'), 'w+', np.int64, (n_rows + 1,))
+            offsets[0] = 0
+            for chunk in space.chunks(chunk_size):
+                lengths = chunk.column(length_path).astype(np.int64) + 1
+                rows = slice(chunk.start - space.start + 1, chunk.stop - space.start + 1)
+                offsets[rows] = np.cumsum(lengths) + offsets[chunk.start - space.start]
+            values = np.lib.format.open_memmap(_file(path, name + '.values'), 'w+', np.float64, (int(offsets[-1]),))
+            values[...] = fill
+            schema['solutions'][name] = {'kind': 'ragged', 'length': '.'.join(length_path)}
+            offsets.flush()
+            values.flush()
+
+        _write_schema(path, schema)
+        return cls(path, schema=schema)
+
+    @staticmethod
+    def exists(path:str) -> bool:
+        """
+        Checks whether a directory holds a result store.
+
+        :param path: Directory of the store
+        :return: True if the schema exists
+        """
+        return os.path.exists(os.path.join(path, SCHEMA_FILE))
+
+    @property
+    def rows_written(self) -> int:
+        """
+        Number of leading rows that are complete. Re-read from disk, so it follows a sweep that is still running.
+        """
+        return _read_schema(self.path)['rows_written']
+
+    @property
+    def fingerprint(self) -> str:
+        return self._schema['fingerprint']
+
+    @property
+    def chunk_size(self) -> int:
+        return self._schema['chunk_size']
+
+    @property
+    def chunks_done(self) -> set:
+        """
+        Indices of the chunks that are checkpointed. Re-read from disk.
+        """
+        ranges = _read_schema(self.path)['chunks_done']
+        return {i for first, last in ranges for i in range(first, last + 1)}
+
+    def write(self, start:int, solutions:dict):
+        """
+        Writes rows of solutions into the store.
+
+        :param start: First row (relative to the start of the store)
+        :param solutions: Dictionary of path to array with one row per row to write, distributions padded
+        :return: None
+        """
+        for sol_path, values in solutions.items():
+            name = '.'.join(sol_path)
+            stop = start + len(values)
+            if self._schema['solutions'][name]['kind'] == 'array':
+                self._open(name, 'r+')[start:stop] = values
+                continue
+            # Strip the padding of the distributions
+            offsets = self._open(name + '.offsets', 'r')
+            lengths = np.diff(offsets[start:stop + 1])
+            mask = np.arange(values.shape[1]) < lengths[:, None]
+            self._open(name + '.values', 'r+')[offsets[start]:offsets[stop]] = values[mask]
+
+    def flush(self):
+        """
+        Writes changes of the opened columns to disk.
+
+        :return: None
+        """
+        for column in self._files.values():
+            column.flush()
+
+    def mark_done(self, index:int):
+        """
+        Flushes the columns and checkpoints a completed chunk in the schema.
+
+        :param index: Index of the chunk
+        :return: None
+        """
+        self.flush()
+        # Completed chunks are kept as sorted, merged ranges of indices
+        ranges = self._schema['chunks_done'] + [[index, index]]
+        ranges.sort()
+        merged = [ranges[0]]
+        for first, last in ranges[1:]:
+            if first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        self._schema['chunks_done'] = merged
+        # Leading complete rows
+        n_leading = merged[0][1] + 1 if merged[0][0] == 0 else 0
+        self._schema['rows_written'] = min(n_leading * self.chunk_size, self._schema['n_rows'])
+        _write_schema(self.path, self._schema)
+
+    def __getitem__(self, key):
+        path = self._prefix + (key,)
+        name = '.'.join(path)
+        # Parameter -> column computed from the row indices when indexed
+        parameter = self._schema['parameters'].get(name)
+        if parameter is not None:
+            return ParameterColumn(
+                np.asarray(parameter['values'], dtype=parameter['dtype']), parameter['size'], parameter['stride'],
+                self._schema['start'], self._schema['n_rows']
+            )
+        # Solution -> open memory-mapped files
+        solution = self._schema['solutions'].get(name)
+        if solution is not None:
+            if solution['kind'] == 'array':
+                return self._open(name, 'r')
+            return RaggedArray(self._open(name + '.values', 'r'), self._open(name + '.offsets', 'r'))
+        # Inner node -> store restricted to the sub path
+        if any(n.startswith(name + '.') for n in self._names()):
+            return ResultStore(self.path, path, self._schema)
+        raise KeyError(key)
+
+    def __iter__(self):
+        keys = []
+        for name in self._names():
+            path = tuple(name.split('.'))
+            if path[:len(self._prefix)] == self._prefix and len(path) > len(self._prefix):
+                if path[len(self._prefix)] not in keys:
+                    keys.append(path[len(self._prefix)])
+        return iter(keys)
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    def _names(self) -> list:
+        return list(self._schema['parameters']) + list(self._schema['solutions'])
+
+    def _open(self, name:str, mode:str) -> np.ndarray:
+        # Memory-map file once per mode
+        column = self._files.get((name, mode))
+        if column is None:
+            column = np.load(_file(self.path, name), mmap_mode=mode)
+            self._files[(name, mode)] = column
+        return column
+
+
+def _file(path:str, name:str) -> str:
+    return os.path.join(path, name + '.npy')
+
+
+def _read_schema(path:str) -> dict:
+    with open(os.path.join(path, SCHEMA_FILE)) as file:
+        return json.load(file)
+
+
+def _write_schema(path:str, schema:dict):
+    # Replace atomically, readers never see a partially written schema
+    temp = os.path.join(path, SCHEMA_FILE + '.tmp')
+    with open(temp, 'w') as file:
+        json.dump(schema, file, indent=4)
+    os.replace(temp, os.path.join(path, SCHEMA_FILE))
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,203 @@
+import json
+import time
+import contextlib
+
+
+"""
+Opt-in instrumentation of simulations: wall time per stage, kernel call counts and statistics of the dynamic
+programming kernels. Disabled by default, instrumented code then only pays for a flag check. Records are kept per
+process, worker processes send theirs to the parent which merges them.
+"""
+
+
+# Global switch and records since the last reset
+_enabled = False
+_stages = {}
+_kernels = {}
+_dp = {'calls': 0, 'shots': 0, 'peak_states_sum': 0, 'peak_states_max': 0}
+
+# Returned by stage() if disabled, entering and leaving it does nothing
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class _Stage:
+    # Context manager adding its wall time to a stage record
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name:str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        record = _stages.get(self.name)
+        if record is None:
+            record = _stages[self.name] = {'calls': 0, 'time': 0.}
+        record['calls'] += 1
+        record['time'] += elapsed
+        return False
+
+
+def enable(reset_records:bool=True):
+    """
+    Switches instrumentation on.
+
+    :param reset_records: Discard the records collected so far
+    :return: None
+    """
+    global _enabled
+    if reset_records:
+        reset()
+    _enabled = True
+
+
+def disable():
+    """
+    Switches instrumentation off, the records are kept until the next reset.
+
+    :return: None
+    """
+    global _enabled
+    _enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """
+    Discards all records.
+
+    :return: None
+    """
+    _stages.clear()
+    _kernels.clear()
+    for key in _dp:
+        _dp[key] = 0
+
+
+@contextlib.contextmanager
+def recording(path:str=None):
+    """
+    Enables instrumentation for a block of code and restores the previous state afterwards.
+
+    :param path: JSON file the report is written to when the block is left, not written if not provided
+    :return: Context manager
+    """
+    was_enabled = _enabled
+    enable()
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+        if path is not None:
+            write_report(path)
+
+
+def stage(name:str):
+    """
+    Measures the wall time of a stage, used as 'with stage(name): ...'. Nested stages are timed inclusively.
+
+    :param name: Name of the stage
+    :return: Context manager
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def kernel(name:str, rows:int=1):
+    """
+    Counts a kernel call.
+
+    :param name: Name of the kernel
+    :param rows: Number of parameter sets evaluated by the call (batched kernels)
+    :return: None
+    """
+    if not _enabled:
+        return
+    record = _kernels.get(name)
+    if record is None:
+        record = _kernels[name] = {'calls': 0, 'rows': 0}
+    record['calls'] += 1
+    record['rows'] += rows
+
+
+def dp_stats(peak_states, shots):
+    """
+    Records the statistics of dynamic programming evaluations of the time to kill distribution.
+
+    :param peak_states: Maximum number of live health states over all shots, scalar or array (one per evaluation)
+    :param shots: Number of shots processed, scalar or array
+    :return: None
+    """
+    if not _enabled:
+        return
+    if hasattr(peak_states, '__len__'):
+        if len(peak_states) == 0:
+            return
+        _dp['calls'] += len(peak_states)
+        _dp['shots'] += int(sum(shots))
+        _dp['peak_states_sum'] += int(sum(peak_states))
+        _dp['peak_states_max'] = max(_dp['peak_states_max'], int(max(peak_states)))
+        return
+    _dp['calls'] += 1
+    _dp['shots'] += int(shots)
+    _dp['peak_states_sum'] += int(peak_states)
+    _dp['peak_states_max'] = max(_dp['peak_states_max'], int(peak_states))
+
+
+def report() -> dict:
+    """
+    Collects the records into a report.
+
+    :return: Dictionary with stage times [s] and calls, kernel calls and rows and dynamic programming statistics
+    """
+    n_calls = _dp['calls']
+    return {
+        'stages': {name: dict(record) for name, record in _stages.items()},
+        'kernels': {name: dict(record) for name, record in _kernels.items()},
+        'dp': {
+            'calls': n_calls,
+            'shots': _dp['shots'],
+            'peak_states_max': _dp['peak_states_max'],
+            'peak_states_mean': _dp['peak_states_sum'] / n_calls if n_calls else 0.,
+            'peak_states_sum': _dp['peak_states_sum'],
+        },
+    }
+
+
+def merge(other:dict):
+    """
+    Adds the records of another report, e.g. of a worker process. Stage times of several processes add up.
+
+    :param other: Report as returned by report()
+    :return: None
+    """
+    for records, others in ((_stages, other['stages']), (_kernels, other['kernels'])):
+        for name, record in others.items():
+            own = records.setdefault(name, dict.fromkeys(record, 0))
+            for key, value in record.items():
+                own[key] += value
+    for key in ('calls', 'shots', 'peak_states_sum'):
+        _dp[key] += other['dp'][key]
+    _dp['peak_states_max'] = max(_dp['peak_states_max'], other['dp']['peak_states_max'])
+
+
+def write_report(path:str):
+    """
+    Writes the report to a JSON file.
+
+    :param path: Path of the file
+    :return: None
+    """
+    with open(path, 'w') as file:
+        json.dump(report(), file, indent=4)
+
+
+if __name__ == '__main__':
+    pass
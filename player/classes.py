@@ -1,4 +1,4 @@
-from weapon import Weapon
+from weapon.classes import Weapon
 from dataclasses import dataclass
 
 
@@ -227,10 +227,11 @@ def surface(ax: plt.Subplot, x1, x2, y, y_limits=None, x1_label=None, x2_label=N
 
 
 def plot(ax:plt.Subplot, x:np.ndarray, y:np.ndarray, c=None, x_label:str=None, y_label:str=None, norm_limits=None):
-    if len(x.shape) == 1:
-        x = x[:, None].T
-    if len(y.shape) == 1:
-        y = y[:, None].T
+    # Single line -> wrap, multiple lines may have different lengths
+    if np.ndim(x[0]) == 0:
+        x = [x]
+    if np.ndim(y[0]) == 0:
+        y = [y]
 
     cmap, norm = None, None
 
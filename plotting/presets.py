@@ -2,7 +2,7 @@ import numpy as np
 from plotting import utils, figures
 
 
-def time_to_kill(engagement_result:dict):
+def time_to_kill(engagement_result:dict, index:int=0):
 
     # Define path structure to values in engagement result
     x_path = [
@@ -15,9 +15,9 @@ def time_to_kill(engagement_result:dict):
     ]
     y_bar_path = ['solution', 'win_rates']
 
-    # Get values from path
-    x_plot = utils.values_from_dict(engagement_result, x_path)
-    y_plot = utils.values_from_dict(engagement_result, y_path)
+    # Get values from path, distributions of the selected engagement (rows of ragged arrays are views)
+    x_plot = [x[index] for x in utils.values_from_dict(engagement_result, x_path)]
+    y_plot = [y[index] for y in utils.values_from_dict(engagement_result, y_path)]
     y_bar = utils.values_from_dict(engagement_result, y_bar_path)
     # Plot figure
     figures.plot(
@@ -25,7 +25,7 @@ def time_to_kill(engagement_result:dict):
         y=y_plot,
         x_label='Time to Kill [s]',
         y_label='Probability',
-        y_bar=np.array([y_bar[0][1], y_bar[0][2], y_bar[0][0]]),  # reordering
+        y_bar=np.array([y_bar[index][1], y_bar[index][2], y_bar[index][0]]),  # reordering
         labels_bar=['Player 1', 'Player 2', 'Draw']
     )
 
@@ -21,9 +21,9 @@ def values_from_dict(dct:dict, paths:list):
     """
     Returns values form a nested dict according to provided key paths.
 
-    :param dct: Nested dictionary
+    :param dct: Nested dictionary (or engagement Results)
     :param paths: List of dictionary keys
-    :return: Numpy array of dictionary values
+    :return: Numpy array of dictionary values, ragged arrays are returned as they are (list of them for multiple paths)
     """
     # Check if list of paths is given
     is_single_path = not isinstance(paths[0], list)
@@ -38,9 +38,13 @@ def values_from_dict(dct:dict, paths:list):
         for key in path:
             temp = temp[key]
         value_list.append(temp)
+    # Keep ragged distributions without copying them into a padded array
+    is_ragged = any(hasattr(value, 'offsets') for value in value_list)
     # Unwrap result if only one path was given
     if is_single_path:
         value_list = value_list[0]
+    if is_ragged:
+        return value_list
     return np.array(value_list)
 
 
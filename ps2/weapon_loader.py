@@ -178,7 +178,8 @@ def download_weapon(id_or_name):
     save_weapon(formatted_data)
 
 
-def extract_stats(item_id:int, player_state_id:int=0, fire_mode:str='Auto', ads:bool=True, attachments:List[str]=()) -> dict:
+def extract_stats(item_id:int, player_state_id:int=0, fire_mode:str='Auto', ads:bool=True, attachments:List[str]=(),
+                  path:str=None) -> dict:
     """
     Loads relevant weapon data for engagement simulator from preformatted weapon data file.
 
@@ -187,12 +188,15 @@ def extract_stats(item_id:int, player_state_id:int=0, fire_mode:str='Auto', ads:
     :param fire_mode: Wanted fire mode (Auto/Semi-Auto/Burst?) TODO: check burst name
     :param ads: Aiming down sight or hip-fire
     :param attachments: List of attachment (full name required)
+    :param path: Folder of the preformatted weapon data files (including trailing separator), resources folder if not
+        provided
     :return: Formatted weapon data for engagement simulation
     """
     data = {}
     # Load stats file of weapon
-
-    data['full'] = ps2.utils.json_to_dict(str(item_id), constants.DIR + 'resources\\weapons\\')
+    if path is None:
+        path = constants.DIR + 'resources\\weapons\\'
+    data['full'] = ps2.utils.json_to_dict(str(item_id), path)
     # Filter data by fire mode
     data_fire_modes = ps2.utils.filter_list(data['full']['fire_mode'], name=fire_mode)
     # Filter ADS/hip-fire
@@ -0,0 +1,109 @@
+import itertools
+import numpy as np
+import pytest
+from computation.graph import Graph, Input, Operation
+from computation.scheduler import Scheduler
+
+
+"""
+Equivalence of all evaluation modes of a graph with plain evaluation of every combination of the inputs.
+"""
+
+
+VALUES = {
+    'a': [1., 2., 3.],
+    'unused': [10., 20.],
+    'b': [0.5, -1.],
+    'single': [4.],
+    'c': [2., 3., 5., 7.],
+}
+
+
+def constant():
+    return 2.
+
+
+def add(x, y):
+    return x + y
+
+
+def mul(x, y):
+    return x * y
+
+
+def _graph() -> Graph:
+    # Constant operation without inputs, an input no operation depends on and an input with a single value
+    inputs = {name: Input(name) for name in VALUES}
+    const = Operation(constant, (), name='const')
+    total = Operation(add, (inputs['a'], inputs['b']), name='total', vectorized=True, executor='thread')
+    product = Operation(mul, (total, inputs['c']), name='product', vectorized=True, executor='process')
+    shifted = Operation(add, (product, const), name='shifted', vectorized=True)
+    final = Operation(add, (shifted, inputs['single']), name='final', vectorized=True, executor='thread')
+    return Graph(list(inputs.values()), final)
+
+
+def _reference() -> dict:
+    # Every combination evaluated on its own, last input varying fastest. Columns are in the order of the graph
+    # outputs: inputs, then operations in evaluation order (arguments first)
+    columns = {name: [] for name in list(VALUES) + ['total', 'product', 'const', 'shifted', 'final']}
+    for combi in itertools.product(*VALUES.values()):
+        values = dict(zip(VALUES, combi))
+        values['total'] = add(values['a'], values['b'])
+        values['product'] = mul(values['total'], values['c'])
+        values['const'] = constant()
+        values['shifted'] = add(values['product'], values['const'])
+        values['final'] = add(values['shifted'], values['single'])
+        for name, column in columns.items():
+            column.append(values[name])
+    return columns
+
+
+def _assert_equal(result:dict, reference:dict):
+    assert list(result) == list(reference)
+    for name, values in reference.items():
+        np.testing.assert_array_equal(np.asarray(result[name], dtype=np.float64), values, err_msg=name)
+
+
+def test_call_matches_product():
+    graph = _graph()
+    _assert_equal(graph(*VALUES.values()), _reference())
+    # Loop order keeps the inputs of the constant and the sum outside, operations are evaluated less often
+    assert graph.stats['saved'] > 0
+
+
+def test_vectorized_matches_product():
+    _assert_equal(_graph()(*VALUES.values(), vectorized=True), _reference())
+
+
+@pytest.mark.parametrize('chunk_size', [5, 1_000])
+def test_scheduler_matches_product(chunk_size):
+    with Scheduler(_graph(), threads=2, processes=2, chunk_size=chunk_size) as scheduler:
+        _assert_equal(scheduler(*VALUES.values()), _reference())
+
+
+@pytest.mark.parametrize('parallel', [False, True])
+def test_compiled_matches_product(parallel):
+    compiled = _graph().compile(parallel)
+    _assert_equal(compiled(*VALUES.values()), _reference())
+    assert compiled.fused
+
+
+@pytest.mark.parametrize('chunk_size', [7, 1_000])
+def test_iter_matches_product(chunk_size):
+    reference = _reference()
+    chunks = list(_graph().iter(*VALUES.values(), chunk_size=chunk_size))
+    # All chunks but the last are full
+    assert all(len(chunk['final']) == chunk_size for chunk in chunks[:-1])
+    result = {name: sum((chunk[name] for chunk in chunks), []) for name in chunks[0]}
+    _assert_equal(result, reference)
+
+
+def test_iter_selected_outputs():
+    reference = _reference()
+    chunks = list(_graph().iter(*VALUES.values(), outputs=['final', 'const'], chunk_size=7))
+    result = {name: sum((chunk[name] for chunk in chunks), []) for name in ('final', 'const')}
+    _assert_equal(result, {name: reference[name] for name in ('final', 'const')})
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from engagement.classes import Engagement
+from player.classes import Player
+
+
+"""
+Checkpointed sweeps in an on-disk result store against in-memory columnar sweeps.
+"""
+
+
+CHUNK_SIZE = 7
+N_INTERRUPT = 3
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _engagement() -> Engagement:
+    # 60 engagements, 9 chunks (the last one partial)
+    eng = Engagement(Player(), Player())
+    eng.player_1.distance = [0., 20., 40., 60., 80.]
+    eng.player_1.skill.accuracy = [0.3, 0.6, 0.9]
+    eng.player_2.skill.headshot_ratio = [0., 0.2, 0.4, 0.6]
+    return eng
+
+
+def _record_chunks(monkeypatch, interrupt:int=None) -> list:
+    # Start row of every computed chunk, raises after the given number of chunks
+    starts = []
+    chunk_solutions = Engagement._chunk_solutions
+
+    def recording(self, chunk, layout):
+        if interrupt is not None and len(starts) == interrupt:
+            raise Interrupted()
+        starts.append(chunk.start)
+        return chunk_solutions(self, chunk, layout)
+
+    monkeypatch.setattr(Engagement, '_chunk_solutions', recording)
+    return starts
+
+
+def test_resume_computes_remaining_chunks(tmp_path, monkeypatch):
+    eng = _engagement()
+    path = str(tmp_path / 'store')
+    all_starts = list(range(0, len(eng.space()), CHUNK_SIZE))
+
+    with monkeypatch.context() as patch:
+        starts = _record_chunks(patch, N_INTERRUPT)
+        with pytest.raises(Interrupted):
+            eng.simulate(store=path, chunk_size=CHUNK_SIZE)
+    assert starts == all_starts[:N_INTERRUPT]
+
+    # Chunk size of the store is kept, only the chunks after the checkpoint are computed
+    starts = _record_chunks(monkeypatch)
+    store = eng.simulate(store=path, chunk_size=2 * CHUNK_SIZE)
+    assert starts == all_starts[N_INTERRUPT:]
+    assert store.chunks_done == set(range(len(all_starts)))
+
+    res = eng.simulate(columnar=True)
+    np.testing.assert_array_equal(store['solution']['win_rates'], res['solution']['win_rates'])
+    for key in ('player_1', 'player_2'):
+        np.testing.assert_array_equal(store[key]['distance'], res[key]['distance'])
+        np.testing.assert_array_equal(store[key]['solution']['ref_time'], res[key]['solution']['ref_time'])
+        for name in ('time_to_kill', 'kill_probability'):
+            stored, computed = store[key]['solution'][name], res[key]['solution'][name]
+            np.testing.assert_array_equal(stored.offsets, computed.offsets)
+            np.testing.assert_array_equal(stored.values, computed.values)
+
+
+def test_resume_with_changed_player_raises(tmp_path):
+    eng = _engagement()
+    path = str(tmp_path / 'store')
+    eng.simulate(store=path, chunk_size=CHUNK_SIZE)
+    eng.player_2.skill.accuracy = [0.5]
+    with pytest.raises(ValueError):
+        eng.simulate(store=path, chunk_size=CHUNK_SIZE)
+    # Overwriting the store starts a new sweep
+    store = eng.simulate(store=path, chunk_size=CHUNK_SIZE, resume=False)
+    np.testing.assert_array_equal(store['player_2']['skill']['accuracy'], 0.5)
+
+
+if __name__ == '__main__':
+    pass
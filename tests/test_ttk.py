@@ -0,0 +1,230 @@
+import math
+import numpy as np
+import pytest
+from engagement.classes import Engagement
+from engagement.compositions import time_to_kill, time_to_kill_batch, ttk_cache_clear, win_rate
+from engagement.functions import (
+    calc_ttk_distribution, calc_ttk_distribution_closed, calc_ttk_distribution_batch, calc_ttk_distribution_grid,
+    calc_ttk_distribution_pruned, calc_win_rates, calc_distribution_error
+)
+from player.classes import Player
+
+
+"""
+Equivalence of the optimized kernels with the reference implementations they replace.
+"""
+
+
+TOLERANCE = 1e-12
+N_SETS = 50
+
+
+def _reference_ttk(acc, hsr, health_base, health_shield, health_overshield, dmg_head, dmg_body, time_refire, time_fly,
+                   resist_head, resist_body, heal_rate, clip_size, overshield_decay):
+    # Dictionary based dynamic programming over all health values, as the original kernel
+    health_init = health_base + health_shield + health_overshield
+    events = [(1 - acc, 0.), (acc * (1 - hsr), dmg_body * (1 - resist_body)), (acc * hsr, dmg_head * (1 - resist_head))]
+    times, probs = [], []
+    healths = {health_init: 1.}
+    time = time_fly
+    for _ in range(clip_size):
+        times.append(time)
+        probs.append(0.)
+        healths_new = {}
+        for health, prob in healths.items():
+            for p_event, dmg in events:
+                h_cur = health
+                if h_cur > health_init - health_overshield:
+                    h_cur = max(h_cur - overshield_decay * time_refire, health_init - health_overshield)
+                h_cur -= dmg
+                if h_cur <= 0:
+                    probs[-1] += prob * p_event
+                    continue
+                if h_cur < health_base:
+                    h_cur = min(h_cur + heal_rate * time_refire, health_base)
+                healths_new[h_cur] = healths_new.get(h_cur, 0.) + prob * p_event
+        time += time_refire
+        healths = healths_new
+    times.append(math.inf)
+    probs.append(sum(healths.values()))
+    return np.array(times), np.array(probs)
+
+
+def _reference_win_rates(times1, probs1, times2, probs2, latency1, latency2):
+    # Double loop over both distributions, as the original kernel
+    win_probs = [0., 0., 0.]
+    for i in range(len(times1)):
+        for j in range(len(times2)):
+            if times2[j] > times1[i] + latency2:
+                win_probs[1] += probs1[i] * probs2[j]
+            elif times2[j] < times1[i] - latency1:
+                win_probs[2] += probs1[i] * probs2[j]
+            else:
+                win_probs[0] += probs1[i] * probs2[j]
+    return np.array(win_probs)
+
+
+def _random_parameters(rng:np.random.Generator, dynamic:bool) -> tuple:
+    # Kernel arguments of a random parameter set, dynamic sets heal and carry a decaying overshield
+    dmg_body = rng.uniform(100., 200.)
+    return (
+        rng.uniform(0.1, 0.9),
+        rng.uniform(0., 0.8),
+        500.,
+        rng.uniform(0., 500.),
+        rng.uniform(0., 200.) if dynamic else 0.,
+        dmg_body * rng.uniform(1., 2.),
+        dmg_body,
+        rng.uniform(0.05, 0.15),
+        rng.uniform(0., 0.2),
+        rng.uniform(0., 0.3),
+        rng.uniform(0., 0.3),
+        rng.uniform(5., 50.) if dynamic else 0.,
+        # Health states multiply with healing and decay, short clips keep the reference fast
+        int(rng.integers(5, 15 if dynamic else 40)),
+        rng.uniform(5., 30.) if dynamic else 0.,
+    )
+
+
+@pytest.mark.parametrize('seed', range(N_SETS))
+def test_closed_form_matches_dynamic_programming(seed):
+    args = _random_parameters(np.random.default_rng(seed), dynamic=False)
+    times, probs = calc_ttk_distribution(*args)
+    # Closed form takes no healing and overshield decay arguments
+    times_closed, probs_closed = calc_ttk_distribution_closed(*args[:11], args[12])
+    np.testing.assert_array_equal(times_closed, times)
+    np.testing.assert_allclose(probs_closed, probs, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('dynamic', [False, True])
+@pytest.mark.parametrize('seed', range(N_SETS))
+def test_dynamic_programming_matches_reference(seed, dynamic):
+    args = _random_parameters(np.random.default_rng(seed), dynamic)
+    times, probs = calc_ttk_distribution(*args)
+    times_ref, probs_ref = _reference_ttk(*args)
+    np.testing.assert_array_equal(times, times_ref)
+    np.testing.assert_allclose(probs, probs_ref, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('dynamic', [False, True])
+@pytest.mark.parametrize('seed', range(N_SETS))
+def test_grid_is_conservative(seed, dynamic):
+    # Rounded health and damage never make the grid kill earlier than the exact engine
+    args = _random_parameters(np.random.default_rng(seed), dynamic)
+    _, probs = calc_ttk_distribution(*args, 0.)
+    _, probs_grid = calc_ttk_distribution_grid(*args, 0.1)
+    assert np.all(np.cumsum(probs_grid)[:-1] <= np.cumsum(probs)[:-1] + TOLERANCE)
+
+
+def test_grid_breakpoint():
+    # Six hits of 166.657 leave 0.058 health, the kill takes a seventh hit
+    args = (1., 0., 1000., 0., 0., 166.657, 166.657, 0.1, 0., 0., 0., 0., 10, 0.)
+    _, probs = calc_ttk_distribution(*args, 0.)
+    _, probs_grid = calc_ttk_distribution_grid(*args, 0.1)
+    np.testing.assert_allclose(probs_grid, probs, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('epsilon', [0., 1e-6, 1e-3, 1e-2])
+@pytest.mark.parametrize('dynamic', [False, True])
+@pytest.mark.parametrize('seed', range(10))
+def test_pruned_error_is_bounded(seed, dynamic, epsilon):
+    args = _random_parameters(np.random.default_rng(seed), dynamic)
+    times, probs = calc_ttk_distribution(*args)
+    times_pruned, probs_pruned, discarded, _, _ = calc_ttk_distribution_pruned(*args, epsilon)
+    np.testing.assert_array_equal(times_pruned, times)
+    # Discarded mass is missing from the distribution and bounds the deviation of the cumulative probabilities
+    assert discarded <= epsilon
+    assert np.isclose(probs_pruned.sum() + discarded, 1., rtol=0, atol=TOLERANCE)
+    assert calc_distribution_error(probs, probs_pruned) <= epsilon + TOLERANCE
+
+
+@pytest.mark.parametrize('dynamic', [False, True])
+def test_batch_matches_scalar(dynamic):
+    rng = np.random.default_rng(0)
+    sets = [_random_parameters(rng, dynamic) for _ in range(N_SETS)]
+    columns = [np.array(c, dtype=np.int64 if i == 12 else np.float64) for i, c in enumerate(zip(*sets))]
+    times, probs = calc_ttk_distribution_batch(*columns)
+    for i, args in enumerate(sets):
+        times_scalar, probs_scalar = calc_ttk_distribution(*args)
+        n = len(times_scalar)
+        np.testing.assert_array_equal(times[i, :n], times_scalar)
+        np.testing.assert_allclose(probs[i, :n], probs_scalar, rtol=0, atol=TOLERANCE)
+        # Rows are padded with infinite times and zero probabilities
+        assert np.all(np.isinf(times[i, n:]))
+        assert np.all(probs[i, n:] == 0)
+
+
+@pytest.mark.parametrize('seed', range(N_SETS))
+def test_sorted_win_rates_match_reference(seed):
+    rng = np.random.default_rng(seed)
+    dists = []
+    for _ in range(2):
+        args = _random_parameters(rng, dynamic=bool(rng.integers(2)))
+        dists += list(calc_ttk_distribution(*args))
+    latency1, latency2 = rng.uniform(0., 0.1, 2)
+    win_rates = calc_win_rates(*dists, latency1, latency2)
+    np.testing.assert_allclose(win_rates, _reference_win_rates(*dists, latency1, latency2), rtol=0, atol=TOLERANCE)
+
+
+def test_win_rates_with_ties_match_reference():
+    # Equal kill times of both players on the edges of the latency window
+    times = np.array([0.1, 0.2, 0.3, math.inf])
+    probs = np.array([0.25, 0.25, 0.25, 0.25])
+    for latency1, latency2 in ((0., 0.), (0.1, 0.), (0., 0.1), (0.1, 0.2)):
+        win_rates = calc_win_rates(times, probs, times, probs, latency1, latency2)
+        np.testing.assert_allclose(
+            win_rates, _reference_win_rates(times, probs, times, probs, latency1, latency2), rtol=0, atol=TOLERANCE
+        )
+
+
+@pytest.mark.parametrize('dynamic', [False, True])
+def test_classes_match_individual_evaluation(dynamic):
+    rng = np.random.default_rng(1)
+    engagement = Engagement(Player(), Player()).space()[0]
+    attacker = engagement['player_1']
+    target = engagement['player_2']
+    # Few distinct values per parameter, so many parameter sets share their class
+    n = 500
+    attacker['distance'] = rng.choice([0., 10., 30., 60.], n)
+    attacker['skill']['accuracy'] = rng.choice([0.3, 0.6], n)
+    attacker['skill']['headshot_ratio'] = rng.choice([0., 0.2, 0.5], n)
+    attacker['weapon']['damage']['max'] = rng.choice([143., 167.], n)
+    target['health']['shield_primary'] = rng.choice([450., 500., 550.], n)
+    if dynamic:
+        target['heal']['rate'] = rng.choice([0., 10.], n)
+        target['health']['shield_secondary'] = rng.choice([0., 100.], n)
+        target['health']['shield_secondary_decay'] = rng.choice([0., 20.], n)
+    times, probs = time_to_kill_batch(attacker, target, classes=True)
+    times_all, probs_all = time_to_kill_batch(attacker, target, classes=False)
+    np.testing.assert_array_equal(times, times_all)
+    np.testing.assert_allclose(probs, probs_all, rtol=0, atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_kernels_accept_other_array_types(dtype):
+    # Readonly (e.g. memory-mapped store columns) and single precision arrays compile on first use
+    times, probs = calc_ttk_distribution(*_random_parameters(np.random.default_rng(0), dynamic=False))
+    # Times stay in double precision, rounded times would change the ties of the latency window
+    times_other, probs_other = times.copy(), probs.astype(dtype)
+    times_other.flags.writeable = False
+    probs_other.flags.writeable = False
+    win_rates = calc_win_rates(times_other, probs_other, times, probs, 0., 0.)
+    np.testing.assert_allclose(win_rates, calc_win_rates(times, probs, times, probs, 0., 0.), rtol=0, atol=1e-6)
+    assert calc_distribution_error(probs_other, probs_other) == 0
+
+
+def test_cached_distributions_are_readonly():
+    ttk_cache_clear()
+    engagement = Engagement(Player(), Player()).space()[0]
+    times, probs = time_to_kill(engagement)
+    with pytest.raises(ValueError):
+        probs[0] = 1.
+    # Cache hits and win rates see the unchanged distribution
+    times_hit, probs_hit = time_to_kill(engagement)
+    assert probs_hit is probs
+    assert np.isclose(probs_hit.sum(), 1.)
+    assert np.isclose(win_rate(engagement).sum(), 1.)
+
+
+if __name__ == '__main__':
+    pass
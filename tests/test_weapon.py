@@ -0,0 +1,33 @@
+import numpy as np
+from weapon.classes import FlyTimeTable
+from weapon.functions import calc_fly_time
+
+
+"""
+Ballistic fly time tables against closed-form travel times.
+"""
+
+
+def test_straight_flight_matches_closed_form():
+    table = FlyTimeTable(600., 0., 0., 1., 0., 0.)
+    distances = np.linspace(0., 500., 11)
+    np.testing.assert_allclose(table(distances), calc_fly_time(distances, 600.), atol=1e-9)
+    assert np.isinf(table(700.))
+
+
+def test_rocket_accelerates_from_rest():
+    # Uniform acceleration to max speed after 1.5 s and 112.5 m, constant speed for the rest of the lifespan
+    table = FlyTimeTable(0., 150., 100., 5., 0., 0.)
+    np.testing.assert_allclose(table.max_range, 112.5 + 3.5 * 150., rtol=1e-6)
+    np.testing.assert_allclose(table(50.), 1., rtol=1e-6)
+    np.testing.assert_allclose(table(112.5 + 150.), 2.5, rtol=1e-6)
+
+
+def test_projectile_at_rest_without_acceleration_has_no_range():
+    table = FlyTimeTable(0., 0., 0., 5., 0., 0.)
+    assert table.max_range == 0
+    assert np.isinf(table(1.))
+
+
+if __name__ == '__main__':
+    pass
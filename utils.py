@@ -1,4 +1,5 @@
 import itertools
+import numpy as np
 
 
 """
@@ -21,8 +22,8 @@ def iterate_class(cl:object, name:str) -> zip:
         if isinstance(field_val, (list, tuple)):
             field_name = [field_name for i in range(len(field_val))]
             entries.append(zip(field_name, field_val))
-        # Field is the name -> skip
-        elif field_name == 'name':
+        # Field is the name or private -> skip
+        elif field_name == 'name' or field_name.startswith('_'):
             continue
         # Field is nested -> recurse
         else:
@@ -39,7 +40,7 @@ def tuple_to_dict(nested:tuple) -> dict:
     :return: Nested dictionary
     """
     # Check if current value is not a tuple -> return value
-    if isinstance(nested[1], tuple):
+    if not isinstance(nested[1], tuple):
         return nested[1]
     # Value is tuple -> create dictionary and recurse
     else:
@@ -89,5 +90,107 @@ def aggregate_dict(aggregation_dct:dict, dct:dict):
     return aggregation_dct
 
 
+def iterate_columns(cl:object, name:str) -> list:
+    """
+    Recursively collects list fields of class as parameter columns. Same fields and order as iterate_class.
+
+    :param cl: Class object
+    :param name: Class name for column path
+    :return: List of (path, values) tuples, path being the tuple of field names from the top class
+    """
+    columns = []
+    # Iterate through class fields
+    for field_name, field_val in vars(cl).items():
+        # Field not nested -> collect
+        if isinstance(field_val, (list, tuple)):
+            columns.append(((name, field_name), tuple(field_val)))
+        # Field is the name or private -> skip
+        elif field_name == 'name' or field_name.startswith('_'):
+            continue
+        # Field is nested -> recurse and prepend name to paths
+        else:
+            for path, values in iterate_columns(field_val, field_name):
+                columns.append(((name,) + path, values))
+    return columns
+
+
+def table_dtype(columns:list) -> np.dtype:
+    """
+    Creates the structured data type of a product table.
+
+    :param columns: List of (path, values) tuples as returned by iterate_columns
+    :return: Structured data type, one field per column named by the column path joined by '.'
+    """
+    return np.dtype([('.'.join(path), np.asarray(values).dtype) for path, values in columns])
+
+
+def product_table(columns:list, start:int=0, stop:int=None, table:np.ndarray=None) -> np.ndarray:
+    """
+    Creates structured array holding the cartesian product of parameter columns, one field per column. Rows are in
+    the same order as itertools.product (last column varies fastest).
+
+    :param columns: List of (path, values) tuples as returned by iterate_columns
+    :param start: First row of the product
+    :param stop: Row after the last row of the product, full product if not provided
+    :param table: Structured array to write the columns into (other fields are left untouched), created if not provided
+    :return: Structured array, field names are the column paths joined by '.'
+    """
+    sizes = [len(values) for _, values in columns]
+    if stop is None:
+        stop = int(np.prod(sizes))
+    if table is None:
+        table = np.empty(stop - start, dtype=table_dtype(columns))
+    rows = None
+    # Value index of a row follows from the number of combinations of all later columns
+    n_repeat = int(np.prod(sizes))
+    for (path, values), size in zip(columns, sizes):
+        n_repeat //= size
+        # Constant columns are broadcast
+        if size == 1:
+            table['.'.join(path)] = values[0]
+            continue
+        if rows is None:
+            rows = np.arange(start, stop)
+        table['.'.join(path)] = np.asarray(values)[(rows // n_repeat) % size]
+    return table
+
+
+def table_to_dict(table:np.ndarray) -> dict:
+    """
+    Converts structured array into nested dictionary of its columns. Columns are views, no data is copied.
+
+    :param table: Structured array with field names as created by product_table
+    :return: Nested dictionary with arrays as values
+    """
+    dct = {}
+    for field in table.dtype.names:
+        # Walk down the path and create nested dictionaries on the way
+        path = field.split('.')
+        temp = dct
+        for key in path[:-1]:
+            temp = temp.setdefault(key, {})
+        temp[path[-1]] = table[field]
+    return dct
+
+
+
+def unique_rows(array:np.ndarray) -> tuple:
+    """
+    Finds the unique rows of a 2D float array by hashing the bit patterns of the rows. Faster than
+    np.unique(axis=0) as only one integer per row gets sorted. Hash collisions are detected and resolved exactly.
+
+    :param array: 2D float64 array
+    :return: Indices of the first occurrences of the unique rows and index of the unique row for every row
+    """
+    bits = np.ascontiguousarray(array, dtype=np.float64).view(np.uint64)
+    # Weighted sum of the bit patterns with odd random weights, overflow wraps around
+    weights = np.random.default_rng(0).integers(1, 2 ** 63, size=bits.shape[1], dtype=np.uint64) * 2 + 1
+    hashes = (bits * weights).sum(axis=1, dtype=np.uint64)
+    _, index, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    # Rows with equal hash but different values -> fall back to exact comparison
+    if not np.array_equal(bits, bits[index][inverse]):
+        _, index, inverse = np.unique(bits, axis=0, return_index=True, return_inverse=True)
+    return index, inverse.reshape(-1)
+
 if __name__ == '__main__':
     pass
@@ -1,4 +1,6 @@
 import ps2.weapon_loader
+import numpy as np
+from weapon.functions import calc_fly_time_table, calc_fly_time_lookup
 from typing import List
 from dataclasses import dataclass
 
@@ -84,6 +86,24 @@ class Ammo:
     reload_speed: list = (3, )
 
 
+class FlyTimeTable:
+    fly_times: np.ndarray
+    distance_step: float
+    max_range: float
+
+    # CONSTRUCTOR
+
+    def __init__(self, speed, speed_max, acceleration, lifespan, drag, gravity, distance_step:float=0.5):
+        # Integrate trajectory once and tabulate travel time over distance
+        self.distance_step = distance_step
+        self.fly_times, self.max_range = calc_fly_time_table(
+            speed, speed_max, acceleration, drag, gravity, lifespan, distance_step
+        )
+
+    def __call__(self, distance):
+        return calc_fly_time_lookup(distance, self.fly_times, self.distance_step, self.max_range)
+
+
 @dataclass
 class Weapon:
     # VARIABLES
@@ -99,6 +119,8 @@ class Weapon:
     # CONSTRUCTOR
 
     def __init__(self, weapon_id=None, attachments:List[str]=()):
+        # Fly time tables per combination of projectile parameters
+        self._fly_time_tables = {}
         # Load weapon and modifications
         if weapon_id is not None:
             self._load_weapon(weapon_id, attachments)
@@ -112,6 +134,21 @@ class Weapon:
             self.projectile = Projectile()
             self.ammo = Ammo()
 
+    # GETTERS
+
+    def fly_time_table(self, speed, speed_max, acceleration, lifespan, drag, gravity) -> FlyTimeTable:
+        """
+        Returns the fly time table for one combination of projectile parameters. Tables are computed once and cached.
+
+        :return: Fly time table, callable with distance
+        """
+        key = (speed, speed_max, acceleration, lifespan, drag, gravity)
+        table = self._fly_time_tables.get(key)
+        if table is None:
+            table = FlyTimeTable(*key)
+            self._fly_time_tables[key] = table
+        return table
+
     # SETTERS
 
     def _load_weapon(self, weapon_id:int, attachments:List[str]=()):
@@ -1,14 +1,19 @@
+import math
+import numba
+import numpy as np
 
 
 def calc_damage_body(dmg_max: float, dmg_min: float, range_max: float, range_min: float, distance: float) -> float:
-    if distance <= range_max:  # in max damage range
-        dmg_body = dmg_max
-    elif distance >= range_min:  # in min damage range
-        dmg_body = dmg_min
-    else:  # in linear region
-        slope = (dmg_max - dmg_min) / (range_max - range_min)
-        dmg_body = dmg_max + slope * (distance - range_max)
-    return dmg_body
+    # Linear damage falloff between max and min damage range, works element-wise on arrays
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.divide(dmg_max - dmg_min, np.subtract(range_max, range_min))
+        dmg_linear = dmg_max + slope * (np.subtract(distance, range_max))
+    dmg_body = np.where(
+        np.less_equal(distance, range_max),  # in max damage range
+        dmg_max,
+        np.where(np.greater_equal(distance, range_min), dmg_min, dmg_linear)  # in min damage range or linear region
+    )
+    return dmg_body[()]
 
 
 def calc_damage_head(dmg_body: float, dmg_multi_head: float) -> float:
@@ -16,15 +21,121 @@ def calc_damage_head(dmg_body: float, dmg_multi_head: float) -> float:
     return dmg_head
 
 
-def calc_fly_time(distance: float, projectile_speed: float) -> float:
+def calc_fly_time(distance: float, projectile_speed: float, drag: float = 0.) -> float:
     """
-    Returns the travel time of a bullet to the target.
+    Returns the travel time of a bullet to the target. Works element-wise on arrays.
 
     :param distance: The distance to the target [m]
     :param projectile_speed: Velocity of the bullet [m/s]
-    :return: Travel time to target [s]
+    :param drag: Exponential decay rate of the bullet velocity [1/s]
+    :return: Travel time to target [s], infinite if the bullet comes to a halt before
     """
-    return 1 / projectile_speed * distance
+    fly_time = np.divide(distance, projectile_speed)
+    if np.any(np.greater(drag, 0)):
+        # Velocity decays exponentially, covered distance approaches speed / drag
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.multiply(fly_time, drag)
+            fly_time_drag = np.where(ratio < 1, -np.log1p(-np.minimum(ratio, 1)) / drag, np.inf)
+        fly_time = np.where(np.greater(drag, 0), fly_time_drag, fly_time)
+    return np.asarray(fly_time)[()]
+
+
+@numba.njit(cache=True)
+def calc_trajectory(
+        speed: float,
+        speed_max: float,
+        acceleration: float,
+        drag: float,
+        gravity: float,
+        lifespan: float,
+        time_step: float = 1e-3
+):
+    """
+    Integrates the flight of a projectile fired horizontally until its lifespan ends or it stops moving forward.
+
+    :param speed: Initial velocity [m/s]
+    :param speed_max: Maximum velocity reached by acceleration, 0 for no limit [m/s]
+    :param acceleration: Acceleration along the flight direction [m/s^2]
+    :param drag: Velocity proportional deceleration [1/s]
+    :param gravity: Downward acceleration [m/s^2]
+    :param lifespan: Time until the projectile disappears [s]
+    :param time_step: Integration time step [s]
+    :return: Arrays of flight times [s] and horizontal distances [m]
+    """
+    n_steps = max(int(math.ceil(lifespan / time_step)), 1)
+    times = np.zeros(n_steps + 1)
+    distances = np.zeros(n_steps + 1)
+    vel_x = speed
+    vel_z = 0.
+    for i in range(n_steps):
+        vel_x_old = vel_x
+        vel = math.sqrt(vel_x ** 2 + vel_z ** 2)
+        # Acceleration along the flight direction until max speed is reached, drag against it
+        acc = -drag * vel
+        if acceleration != 0 and (speed_max <= 0 or vel < speed_max):
+            acc += acceleration
+        if vel > 0:
+            vel_x += acc * vel_x / vel * time_step
+            vel_z += acc * vel_z / vel * time_step
+        else:
+            # Projectile at rest (e.g. rocket launched without initial speed) accelerates towards the target
+            vel_x += acc * time_step
+        vel_z -= gravity * time_step
+        # Cap velocity at max speed
+        vel = math.sqrt(vel_x ** 2 + vel_z ** 2)
+        if acceleration > 0 and 0 < speed_max < vel:
+            vel_x *= speed_max / vel
+            vel_z *= speed_max / vel
+        # Stop once the projectile doesn't move towards the target anymore (checked after the step, so a
+        # projectile starting at rest gets moving first)
+        if vel_x <= 0:
+            return times[:i + 1], distances[:i + 1]
+        times[i + 1] = times[i] + time_step
+        distances[i + 1] = distances[i] + (vel_x + vel_x_old) / 2 * time_step
+    return times, distances
+
+
+def calc_fly_time_table(
+        speed: float,
+        speed_max: float,
+        acceleration: float,
+        drag: float,
+        gravity: float,
+        lifespan: float,
+        distance_step: float = 0.5
+) -> (np.ndarray, float):
+    """
+    Tabulates the travel time of a projectile on an evenly spaced distance grid.
+
+    :param distance_step: Spacing of the distance grid [m]
+    :return: Array of travel times for distances 0, distance_step, 2 * distance_step, ... and maximum range [m]
+    """
+    times, distances = calc_trajectory(
+        float(speed), float(speed_max), float(acceleration), float(drag), float(gravity), float(lifespan)
+    )
+    max_range = distances[-1]
+    # Grid covers the maximum range, times beyond it are clamped to the lifespan
+    grid = np.arange(int(max_range // distance_step) + 2) * distance_step
+    fly_times = np.interp(grid, distances, times)
+    return fly_times, max_range
+
+
+def calc_fly_time_lookup(distance: float, fly_times: np.ndarray, distance_step: float, max_range: float) -> float:
+    """
+    Returns the travel time from a fly time table by linear interpolation. Works element-wise on arrays.
+
+    :param distance: The distance to the target [m]
+    :param fly_times: Travel times on the distance grid
+    :param distance_step: Spacing of the distance grid [m]
+    :param max_range: Maximum range of the projectile [m]
+    :return: Travel time to target [s], infinite beyond the maximum range
+    """
+    position = np.clip(np.divide(distance, distance_step), 0, len(fly_times) - 1)
+    idx = np.minimum(position.astype(np.int64), len(fly_times) - 2)
+    frac = position - idx
+    fly_time = fly_times[idx] * (1 - frac) + fly_times[idx + 1] * frac
+    return np.where(np.greater(distance, max_range), math.inf, fly_time)[()]
+
 
 
 if __name__ == '__main__':